@@ -0,0 +1,249 @@
+# Course: CS261 - Data Structures
+# Author: Alexander Shen
+# Assignment: 6
+# Description: Reproducible benchmarks for the undirected and the directed graph.
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from d_graph import DirectedGraph
+from ud_graph import UndirectedGraph
+
+# Every graph is generated from its own Random seeded with (seed, generator, size), so a run can be repeated
+# exactly and two runs with the same arguments time the same graphs. The dense generator makes O(V^2) edges,
+# which keeps the default sizes low.
+DEFAULT_SIZES = (100, 500, 2000)
+
+# Number of calls timed for each query or mutation.
+QUERIES = 20
+MUTATIONS = 1000
+
+
+def sparse_edges(rng, n):
+    # About 4 random edges per vertex.
+    edges = []
+    for _ in range(4 * n):
+        u, v = rng.randrange(n), rng.randrange(n)
+        if u != v:
+            edges.append((u, v))
+    return edges
+
+
+def power_law_edges(rng, n):
+    # Preferential attachment, every new vertex links to 3 earlier ones picked in proportion to their degree.
+    edges = []
+    ends = list(range(min(n, 4)))
+    for v in range(len(ends), n):
+        for u in {rng.choice(ends) for _ in range(3)}:
+            # Random directions so the directed version has cycles too.
+            edges.append((v, u) if rng.random() < 0.5 else (u, v))
+            ends.extend((u, v))
+    return edges
+
+
+def grid_edges(rng, n):
+    # Square grid of side sqrt(n), each vertex links to its right and lower neighbour.
+    side = max(2, int(n ** 0.5))
+    edges = []
+    for row in range(side):
+        for col in range(side):
+            v = row * side + col
+            if col + 1 < side:
+                edges.append((v, v + 1) if rng.random() < 0.5 else (v + 1, v))
+            if row + 1 < side:
+                edges.append((v, v + side) if rng.random() < 0.5 else (v + side, v))
+    return edges
+
+
+def dense_edges(rng, n):
+    # Every ordered pair with probability 1/2, on a quarter of the vertices to keep the edge count manageable.
+    n = max(2, n // 4)
+    return [(u, v) for u in range(n) for v in range(n) if u != v and rng.random() < 0.5]
+
+
+GENERATORS = {
+    'sparse': sparse_edges,
+    'power_law': power_law_edges,
+    'grid': grid_edges,
+    'dense': dense_edges,
+}
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def _peak_memory(build):
+    # Peak bytes allocated while build() runs, measured in a run of its own because tracemalloc slows it down.
+    tracemalloc.start()
+    try:
+        build()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _directed_run(edges, weights, rng):
+    # One timed pass over DirectedGraph, returns {operation: (calls, seconds)}.
+    start_edges = [(u, v, w) for (u, v), w in zip(edges, weights)]
+    times = {}
+    start = time.perf_counter()
+    graph = DirectedGraph(start_edges)
+    times['construct'] = (1, time.perf_counter() - start)
+
+    n = graph.v_count
+    sources = [rng.randrange(n) for _ in range(QUERIES)]
+    times['dfs'] = (QUERIES, sum(_timed(graph.dfs, v) for v in sources))
+    times['bfs'] = (QUERIES, sum(_timed(graph.bfs, v) for v in sources))
+    times['has_cycle'] = (1, _timed(graph.has_cycle))
+    times['dijkstra'] = (QUERIES, sum(_timed(graph.dijkstra, v) for v in sources))
+
+    pairs = [(rng.randrange(n), rng.randrange(n), rng.randint(1, 20)) for _ in range(MUTATIONS)]
+    start = time.perf_counter()
+    for u, v, w in pairs:
+        graph.add_edge(u, v, w)
+    times['add_edge'] = (MUTATIONS, time.perf_counter() - start)
+    start = time.perf_counter()
+    for u, v, _ in pairs:
+        graph.remove_edge(u, v)
+    times['remove_edge'] = (MUTATIONS, time.perf_counter() - start)
+    removed = rng.sample(range(n), min(n, MUTATIONS))
+    start = time.perf_counter()
+    for v in removed:
+        graph.remove_vertex(v)
+    times['remove_vertex'] = (len(removed), time.perf_counter() - start)
+    return times
+
+
+def _undirected_run(edges, rng):
+    # One timed pass over UndirectedGraph, returns {operation: (calls, seconds)}.
+    names = [str(v) for v in range(max(max(edge) for edge in edges) + 1)]
+    start_edges = [(names[u], names[v]) for u, v in edges]
+    times = {}
+    start = time.perf_counter()
+    graph = UndirectedGraph(start_edges)
+    times['construct'] = (1, time.perf_counter() - start)
+
+    vertices = graph.get_vertices()
+    sources = [rng.choice(vertices) for _ in range(QUERIES)]
+    times['dfs'] = (QUERIES, sum(_timed(graph.dfs, v) for v in sources))
+    times['bfs'] = (QUERIES, sum(_timed(graph.bfs, v) for v in sources))
+    times['has_cycle'] = (1, _timed(graph.has_cycle))
+    times['count_connected_components'] = (1, _timed(graph.count_connected_components))
+
+    pairs = [(rng.choice(names), rng.choice(names)) for _ in range(MUTATIONS)]
+    start = time.perf_counter()
+    for u, v in pairs:
+        graph.add_edge(u, v)
+    times['add_edge'] = (MUTATIONS, time.perf_counter() - start)
+    start = time.perf_counter()
+    for u, v in pairs:
+        graph.remove_edge(u, v)
+    times['remove_edge'] = (MUTATIONS, time.perf_counter() - start)
+    removed = rng.sample(vertices, min(len(vertices), MUTATIONS))
+    start = time.perf_counter()
+    for v in removed:
+        graph.remove_vertex(v)
+    times['remove_vertex'] = (len(removed), time.perf_counter() - start)
+    return times
+
+
+def run(sizes=DEFAULT_SIZES, generators=tuple(GENERATORS), seed=0, repeat=3):
+    # Time every operation on every graph and return the list of result records.
+    results = []
+    for generator in generators:
+        for size in sizes:
+            rng = random.Random(f'{seed}-{generator}-{size}')
+            edges = GENERATORS[generator](rng, size)
+            if not edges:
+                # Too small for this generator to make an edge, there is no graph to time.
+                print(f'skipping {generator} at size {size}, it has no edges', file=sys.stderr)
+                continue
+            weights = [rng.randint(1, 20) for _ in edges]
+
+            directed = [_directed_run(edges, weights, random.Random(f'{seed}-{generator}-{size}-d'))
+                        for _ in range(repeat)]
+            undirected = [_undirected_run(edges, random.Random(f'{seed}-{generator}-{size}-u'))
+                          for _ in range(repeat)]
+            memory = {
+                'DirectedGraph': _peak_memory(
+                    lambda: DirectedGraph([(u, v, w) for (u, v), w in zip(edges, weights)])),
+                'UndirectedGraph': _peak_memory(
+                    lambda: UndirectedGraph([(str(u), str(v)) for u, v in edges])),
+            }
+
+            vertices = max(max(edge) for edge in edges) + 1
+            for graph, runs in (('DirectedGraph', directed), ('UndirectedGraph', undirected)):
+                for operation in runs[0]:
+                    seconds = [times[operation][1] for times in runs]
+                    record = {
+                        'graph': graph,
+                        'generator': generator,
+                        'size': size,
+                        'vertices': vertices,
+                        'edges': len(edges),
+                        'operation': operation,
+                        'calls': runs[0][operation][0],
+                        'seconds': statistics.median(seconds),
+                        'min_seconds': min(seconds),
+                    }
+                    if operation == 'construct':
+                        record['peak_bytes'] = memory[graph]
+                    results.append(record)
+    return results
+
+
+def compare(results, baseline):
+    # Print how the median time of every operation changed against the records of an earlier run.
+    key = lambda record: (record['graph'], record['generator'], record['size'], record['operation'])
+    before = {key(record): record for record in baseline}
+    for record in results:
+        old = before.get(key(record))
+        if old is None or old['seconds'] == 0:
+            continue
+        ratio = record['seconds'] / old['seconds']
+        print(f'{record["graph"]:16} {record["generator"]:10} {record["size"]:>6} {record["operation"]:27} '
+              f'{old["seconds"]:10.6f}s -> {record["seconds"]:10.6f}s  x{ratio:.2f}', file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark UndirectedGraph and DirectedGraph.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--generators', nargs='+', choices=list(GENERATORS), default=list(GENERATORS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the JSON results here instead of to stdout')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args(argv)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+        },
+        'results': run(args.sizes, args.generators, args.seed, args.repeat),
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report['results'], json.load(f)['results'])
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,719 @@
 # Description: Replicate the data structure of a directed graph.
 
 import heapq
-from collections import deque
+import os
+import tempfile
+from bisect import bisect_left
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from graphlib import CycleError
+
+from graph_io import directed_row, load_snapshot, read_edge_chunks, save_snapshot
+from graph_snapshot import query_batch, share
+from graph_stats import GraphStats, disable_instrumentation, enable_instrumentation
+from parallel_bfs import bfs_levels
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Weights of these types keep integer storage, anything else switches it to doubles.
+INTEGER_TYPES = (int, np.integer) if np is not None else (int,)
+
+
+class _DenseStorage:
+    """
+    Adjacency matrix storage, kept row by row
+    - rows is a list of dicts, rows[src] maps dst to the weight of every non zero entry of the row
+    - a weight of 0 means there is no edge, it is never stored
+    - a vertex without out edges costs one empty dict, so the memory is O(V + E) and adding a vertex is O(1)
+    - row() pads a row out to the full matrix row for adj_matrix and __str__
+    """
+
+    kind = 'dense'
+
+    def __init__(self, rows=None):
+        self.rows = [{dst: weight for dst, weight in enumerate(row) if weight != 0} for row in rows] if rows else []
+        self.size = len(self.rows)
+
+    @classmethod
+    def from_edges(cls, v_count, edges):
+        storage = cls()
+        storage.rows = [{} for _ in range(v_count)]
+        storage.size = v_count
+        storage.update(edges)
+        return storage
+
+    def __len__(self):
+        return self.size
+
+    def copy(self):
+        storage = _DenseStorage()
+        storage.rows = [dict(row) for row in self.rows]
+        storage.size = self.size
+        return storage
+
+    def add_vertices(self, count):
+        self.rows.extend({} for _ in range(count))
+        self.size += count
+
+    def add_vertex(self):
+        self.add_vertices(1)
+
+    def get(self, src, dst):
+        return self.rows[src].get(dst, 0)
+
+    def set(self, src, dst, weight):
+        if weight == 0:
+            self.rows[src].pop(dst, None)
+        else:
+            self.rows[src][dst] = weight
+
+    def update(self, edges):
+        for src, dst, weight in edges:
+            self.set(src, dst, weight)
+
+    def neighbors(self, v):
+        # The entries of the row in column order, O(deg(v) log deg(v)).
+        return sorted(self.rows[v].items())
+
+    def in_neighbors(self, v):
+        # Look up v in every row for the edges coming into it.
+        return [(src, row[v]) for src, row in enumerate(self.rows) if v in row]
+
+    def row(self, v):
+        out = [0] * self.size
+        for dst, weight in self.rows[v].items():
+            out[dst] = weight
+        return out
+
+    def edges(self):
+        for src in range(self.size):
+            for dst, weight in self.neighbors(src):
+                yield src, dst, weight
+
+
+# A CSR merge is never triggered by fewer pending edges than this.
+MERGE_MIN = 1024
+
+# all_pairs_dijkstra() runs in the calling process below this much work, counted as sources * (V + E).
+# Writing the snapshot file and starting the pool costs more than the searches themselves.
+PARALLEL_MIN = 200000
+
+
+def _integral(weights):
+    # Weights read from double storage, with integral ones given back as int. One float weight switches the
+    # whole array to doubles, this keeps every other weight reading 10 instead of 10.0, like dense storage.
+    return [int(weight) if isinstance(weight, float) and weight.is_integer() else weight for weight in weights]
+
+
+class _CSRStorage:
+    """
+    Compressed sparse row storage
+    - the out edges of src are targets[offsets[src]:offsets[src + 1]] with matching weights
+    - targets inside a row are kept in ascending order
+    - new edges wait in a pending buffer, reads lay the pending edges of a row over its slots
+    - a removed edge keeps its slot with weight 0 until the next merge
+    - dirty counts pending edges and zeroed slots, the arrays are rebuilt once it passes a quarter of the edges
+    - reverse is a second _CSRStorage of the in edges, built on the first in edge query and then
+      updated by every write the same way, so it never has to be rebuilt
+    - arrays loaded from a snapshot with mmap are read only memoryviews, copied on the first write
+    """
+
+    kind = 'csr'
+    mapped = False
+
+    def __init__(self, v_count=0):
+        self.offsets = array('q', [0] * (v_count + 1))
+        self.targets = array('q')
+        self.weights = array('q')
+        self.pending = {}
+        self.dirty = 0
+        self.reverse = None
+
+    @classmethod
+    def from_edges(cls, v_count, edges):
+        # Sort the edges by (src, dst) and lay them out row after row.
+        storage = cls(v_count)
+        edges = sorted((src, dst, weight) for src, dst, weight in edges if weight != 0)
+        counts = [0] * (v_count + 1)
+        for src, dst, weight in edges:
+            counts[src + 1] += 1
+            storage._store_weight_type(weight)
+            storage.targets.append(dst)
+            storage.weights.append(weight)
+        for v in range(v_count):
+            counts[v + 1] += counts[v]
+        storage.offsets = array('q', counts)
+        return storage
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def copy(self):
+        # Slicing a mapped memoryview gives another view of the same read only file, which is fine to share.
+        storage = _CSRStorage()
+        storage.offsets, storage.targets, storage.weights = self.offsets[:], self.targets[:], self.weights[:]
+        storage.pending = {src: dict(row) for src, row in self.pending.items()}
+        storage.dirty = self.dirty
+        storage.reverse = self.reverse.copy() if self.reverse is not None else None
+        storage.mapped = self.mapped
+        return storage
+
+    @property
+    def typecode(self):
+        # Works for arrays and for the memoryviews of a mapped snapshot.
+        return memoryview(self.weights).format
+
+    def _store_weight_type(self, weight):
+        # Weights start as 64 bit integers and switch to doubles once a non integer weight shows up.
+        if self.typecode == 'q' and not isinstance(weight, INTEGER_TYPES):
+            self._detach()
+            self.weights = array('d', self.weights)
+
+    def _detach(self):
+        # Copy arrays that still point into a mapped snapshot before writing to them.
+        if self.mapped:
+            self.offsets = array('q', self.offsets.tobytes())
+            self.targets = array('q', self.targets.tobytes())
+            self.weights = array(self.weights.format, self.weights.tobytes())
+            self.mapped = False
+
+    def _find(self, src, dst):
+        # Binary search the row of src, return the slot of dst or -1.
+        lo, hi = self.offsets[src], self.offsets[src + 1]
+        index = bisect_left(self.targets, dst, lo, hi)
+        if index < hi and self.targets[index] == dst:
+            return index
+        return -1
+
+    def _merge_pending(self):
+        # Rebuild the arrays with the pending edges merged in and removed edges dropped.
+        offsets = array('q', [0])
+        targets = array('q')
+        weights = array(self.typecode)
+        for src in range(len(self)):
+            for dst, weight in self.neighbors(src):
+                targets.append(dst)
+                weights.append(weight)
+            offsets.append(len(targets))
+        self.offsets, self.targets, self.weights = offsets, targets, weights
+        self.pending = {}
+        self.dirty = 0
+        self.mapped = False
+
+    def _written(self, count=1):
+        # Count pending edges and zeroed slots. Merging only once they pass a quarter of the edges keeps the
+        # merges at O(1) amortized per write, however writes and reads alternate.
+        self.dirty += count
+        if self.dirty > max(MERGE_MIN, len(self.targets) // 4):
+            self._merge_pending()
+
+    def packed(self):
+        # The arrays with pending edges merged in and removed edges dropped.
+        if self.dirty:
+            self._merge_pending()
+        return self.offsets, self.targets, self.weights
+
+    def _build_reverse(self):
+        # Counting sort the edges by dst, so every in edge list is ordered by src.
+        counts = [0] * (len(self) + 1)
+        for index in range(len(self.targets)):
+            if self.weights[index] != 0:
+                counts[self.targets[index] + 1] += 1
+        for v in range(len(self)):
+            counts[v + 1] += counts[v]
+
+        fill = counts[:-1]
+        sources = array('q', [0]) * counts[-1]
+        weights = array(self.typecode, [0]) * counts[-1]
+        for src in range(len(self)):
+            for index in range(self.offsets[src], self.offsets[src + 1]):
+                if self.weights[index] != 0:
+                    slot = fill[self.targets[index]]
+                    fill[self.targets[index]] += 1
+                    sources[slot] = src
+                    weights[slot] = self.weights[index]
+        reverse = _CSRStorage()
+        reverse.offsets, reverse.targets, reverse.weights = array('q', counts), sources, weights
+        # Pending edges go into the pending buffer of the reverse side.
+        reverse.update([(dst, src, weight) for src, row in self.pending.items() for dst, weight in row.items()])
+        self.reverse = reverse
+
+    def packed_reverse(self):
+        # The in edge arrays with pending edges merged in, sources[offsets[v]:offsets[v + 1]] lead into v.
+        if self.reverse is None:
+            self._build_reverse()
+        return self.reverse.packed()
+
+    def add_vertices(self, count):
+        # New vertices have empty rows, so just repeat the last offset.
+        self._detach()
+        self.offsets.extend(array('q', [self.offsets[-1]]) * count)
+        if self.reverse is not None:
+            self.reverse.add_vertices(count)
+
+    def add_vertex(self):
+        self.add_vertices(1)
+
+    def get(self, src, dst):
+        row = self.pending.get(src)
+        if row is not None and dst in row:
+            return row[dst]
+        index = self._find(src, dst)
+        if index == -1:
+            return 0
+        weight = self.weights[index]
+        return int(weight) if isinstance(weight, float) and weight.is_integer() else weight
+
+    def set(self, src, dst, weight):
+        # Edges already in the arrays are updated in place, new edges go into the pending buffer.
+        self._store_weight_type(weight)
+        if self.reverse is not None:
+            self.reverse.set(dst, src, weight)
+        row = self.pending.get(src)
+        if row is not None and dst in row:
+            row[dst] = weight
+            return
+        index = self._find(src, dst)
+        if index != -1:
+            self._detach()
+            zeroed = weight == 0 and self.weights[index] != 0
+            self.weights[index] = weight
+            if zeroed:
+                self._written()
+        elif weight != 0:
+            self.pending.setdefault(src, {})[dst] = weight
+            self._written()
+
+    def update(self, edges):
+        # Queue the whole batch, a big one is merged right away with a single pass over the arrays.
+        edges = list(edges)
+        if self.reverse is not None:
+            self.reverse.update([(dst, src, weight) for src, dst, weight in edges])
+        count = 0
+        for src, dst, weight in edges:
+            self._store_weight_type(weight)
+            self.pending.setdefault(src, {})[dst] = weight
+            count += 1
+        self._written(count)
+
+    def neighbors(self, v):
+        # O(deg(v)) from the slots of v, plus a sort when v has pending edges.
+        targets, weights = self.targets, self.weights
+        lo, hi = self.offsets[v], self.offsets[v + 1]
+        updates = self.pending.get(v)
+        if updates is None:
+            out = [(targets[index], weights[index]) for index in range(lo, hi) if weights[index] != 0]
+        else:
+            row = {targets[index]: weights[index] for index in range(lo, hi)}
+            row.update(updates)
+            out = [(dst, row[dst]) for dst in sorted(row) if row[dst] != 0]
+        if self.typecode == 'd':
+            return list(zip([dst for dst, _ in out], _integral([weight for _, weight in out])))
+        return out
+
+    def in_neighbors(self, v):
+        if self.reverse is None:
+            self._build_reverse()
+        return self.reverse.neighbors(v)
+
+    def row(self, v):
+        out = [0] * len(self)
+        for dst, weight in self.neighbors(v):
+            out[dst] = weight
+        return out
+
+    def edges(self):
+        for src in range(len(self)):
+            for dst, weight in self.neighbors(src):
+                yield src, dst, weight
+
+
+class _NumpyStorage:
+    """
+    Adjacency matrix in a NumPy array
+    - matrix[src, dst] holds the weight, 0 means there is no edge
+    - the array is allocated with spare capacity that doubles when it runs out
+    - weights are int64 until a non integer weight shows up, then float64
+    - reads give integral weights of a float64 matrix back as int, like the other storages
+    """
+
+    kind = 'numpy'
+
+    def __init__(self, v_count=0):
+        self.matrix = np.zeros((v_count, v_count), dtype=np.int64)
+        self.size = v_count
+
+    @classmethod
+    def from_edges(cls, v_count, edges):
+        storage = cls(v_count)
+        storage.update(edges)
+        return storage
+
+    def __len__(self):
+        return self.size
+
+    def copy(self):
+        storage = _NumpyStorage()
+        storage.matrix = self.matrix.copy()
+        storage.size = self.size
+        return storage
+
+    @property
+    def active(self):
+        # The part of the matrix that holds vertices.
+        return self.matrix[:self.size, :self.size]
+
+    def _store_weight_type(self, weight):
+        if self.matrix.dtype == np.int64 and not isinstance(weight, INTEGER_TYPES):
+            self.matrix = self.matrix.astype(np.float64)
+
+    def _values(self, weights):
+        # The weights of an ndarray as a list of Python numbers.
+        if self.matrix.dtype == np.float64:
+            return _integral(weights.tolist())
+        return weights.tolist()
+
+    def add_vertices(self, count):
+        # Double the capacity when it runs out so adding a vertex is O(1) amortized.
+        needed = self.size + count
+        capacity = len(self.matrix)
+        if needed > capacity:
+            matrix = np.zeros((max(needed, 2 * capacity),) * 2, dtype=self.matrix.dtype)
+            matrix[:capacity, :capacity] = self.matrix
+            self.matrix = matrix
+        self.size = needed
+
+    def add_vertex(self):
+        self.add_vertices(1)
+
+    def get(self, src, dst):
+        return self._values(self.matrix[src, dst:dst + 1])[0]
+
+    def set(self, src, dst, weight):
+        self._store_weight_type(weight)
+        self.matrix[src, dst] = weight
+
+    def update(self, edges):
+        # Write the whole batch with one fancy indexing assignment.
+        edges = list(edges)
+        if not edges:
+            return
+        sources, targets, weights = zip(*edges)
+        for weight in weights:
+            self._store_weight_type(weight)
+        self.matrix[list(sources), list(targets)] = weights
+
+    def neighbors(self, v):
+        row = self.matrix[v, :self.size]
+        targets = np.flatnonzero(row)
+        return list(zip(targets.tolist(), self._values(row[targets])))
+
+    def in_neighbors(self, v):
+        column = self.matrix[:self.size, v]
+        sources = np.flatnonzero(column)
+        return list(zip(sources.tolist(), self._values(column[sources])))
+
+    def row(self, v):
+        return self._values(self.matrix[v, :self.size])
+
+    def edges(self):
+        # nonzero walks the matrix row by row, so the edges come out ordered by (src, dst).
+        sources, targets = np.nonzero(self.active)
+        weights = self.active[sources, targets]
+        return zip(sources.tolist(), targets.tolist(), self._values(weights))
+
+
+_STORAGE = {'dense': _DenseStorage, 'csr': _CSRStorage, 'numpy': _NumpyStorage}
+
+
+def _storage_class(kind):
+    # Look up a storage by name, 'numpy' is only available with NumPy installed.
+    if kind not in _STORAGE:
+        raise ValueError(f'unknown storage {kind!r}, expected one of {sorted(_STORAGE)}')
+    if kind == 'numpy' and np is None:
+        raise ImportError("storage 'numpy' needs NumPy installed")
+    return _STORAGE[kind]
+
+
+def _edge_rows(edges):
+    # Accept (src, dst) or (src, dst, weight) rows from any iterable, including NumPy arrays.
+    if hasattr(edges, 'tolist'):
+        edges = edges.tolist()
+    for edge in edges:
+        if len(edge) == 2:
+            src, dst = edge
+            weight = 1
+        else:
+            src, dst, weight = edge
+        yield int(src), int(dst), weight
+
+
+def _valid_edges(edges, v_count):
+    # Apply the same checks as add_edge, a later edge between the same pair replaces the earlier one.
+    valid = {}
+    for src, dst, weight in edges:
+        if weight < 0 or src == dst:
+            continue
+        if src < 0 or src >= v_count or dst < 0 or dst >= v_count:
+            continue
+        valid[src, dst] = weight
+    return [(src, dst, weight) for (src, dst), weight in valid.items()]
+
+
+def _csr_dijkstra(offsets, targets, weights, src, counts=None):
+    # Single source Dijkstra straight over packed CSR arrays, used by dijkstra() and the all pairs workers.
+    # A full run settles every reachable vertex anyway, so heapq with skipped stale entries is the cheapest heap here.
+    # counts, if given, gets [vertices settled, edges relaxed, heap pushes] added to it.
+    distance = [float('inf')] * (len(offsets) - 1)
+    distance[src] = 0
+    heap_list = [(0, src)]
+    settled = relaxed = 0
+    pushes = 1
+
+    while heap_list:
+        dist, vertex = heapq.heappop(heap_list)
+        if dist > distance[vertex]:
+            continue
+        lo, hi = offsets[vertex], offsets[vertex + 1]
+        settled += 1
+        relaxed += hi - lo
+        for index in range(lo, hi):
+            total_distance = dist + weights[index]
+            num = targets[index]
+            if total_distance < distance[num]:
+                distance[num] = total_distance
+                heapq.heappush(heap_list, (total_distance, num))
+                pushes += 1
+
+    if counts is not None:
+        counts[0] += settled
+        counts[1] += relaxed
+        counts[2] += pushes
+    return distance
+
+
+# CSR arrays of the graph a pool worker is serving, read from a memory mapped file.
+_worker_csr = None
+
+
+def _open_shared_csr(path):
+    # Pool initializer, maps the snapshot read only and views the three arrays without copying them.
+    global _worker_csr
+    snapshot = load_snapshot(path, 'directed')
+    _worker_csr = (snapshot.offsets, snapshot.targets, snapshot.weights)
+
+
+def _dijkstra_rows(sources):
+    # Pool task, returns the distance rows of sources packed as doubles.
+    rows = array('d')
+    for src in sources:
+        rows.extend(_csr_dijkstra(*_worker_csr, src))
+    return rows.tobytes()
+
+
+class DistanceMatrix:
+    """
+    Shortest distances from a list of sources
+    - the rows are stored one after the other in a single array of doubles
+    - matrix[i] is the distance list of sources[i], inf if a vertex can't be reached
+    - iterating the matrix yields its rows in the order of sources
+    """
+
+    def __init__(self, sources, v_count, data):
+        self.sources = list(sources)
+        self.v_count = v_count
+        self.data = data
+        self._index = {src: index for index, src in enumerate(self.sources)}
+
+    def __len__(self):
+        return len(self.sources)
+
+    def __getitem__(self, index):
+        # Only 0 to len - 1 name a row, anything else would slice an empty list out of the data.
+        if not 0 <= index < len(self.sources):
+            raise IndexError(f'row {index} is out of range for {len(self.sources)} sources')
+        start = index * self.v_count
+        return self.data[start:start + self.v_count].tolist()
+
+    def __iter__(self):
+        for index in range(len(self.sources)):
+            yield self[index]
+
+    def distance(self, src, dst):
+        return self.data[self._index[src] * self.v_count + dst]
+
+
+class _IndexedHeap:
+    """
+    Binary min heap of vertices keyed by distance
+    - position[v] is the slot of v in the heap, so its key can be lowered in place
+    - every vertex is in the heap at most once
+    - ties are broken by the smaller vertex, like heapq on (distance, vertex) tuples
+    - pushes counts inserts and lowered keys, pops counts removals
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.position = {}
+        self.pushes = 0
+        self.pops = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, vertex, key):
+        # Insert the vertex, or lower its key if it is already in the heap.
+        index = self.position.get(vertex)
+        if index is None:
+            index = len(self.heap)
+            self.heap.append((key, vertex))
+        elif key < self.heap[index][0]:
+            self.heap[index] = (key, vertex)
+        else:
+            return
+        self.pushes += 1
+        self._sift_up(index)
+
+    def pop(self):
+        # Remove and return the (key, vertex) pair with the smallest key.
+        self.pops += 1
+        top = self.heap[0]
+        last = self.heap.pop()
+        del self.position[top[1]]
+        if self.heap:
+            self.heap[0] = last
+            self.position[last[1]] = 0
+            self._sift_down(0)
+        return top
+
+    def _sift_up(self, index):
+        heap, position = self.heap, self.position
+        item = heap[index]
+        while index > 0:
+            parent = (index - 1) // 2
+            if heap[parent] <= item:
+                break
+            heap[index] = heap[parent]
+            position[heap[index][1]] = index
+            index = parent
+        heap[index] = item
+        position[item[1]] = index
+
+    def _sift_down(self, index):
+        heap, position = self.heap, self.position
+        item = heap[index]
+        size = len(heap)
+        while True:
+            child = 2 * index + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if item <= heap[child]:
+                break
+            heap[index] = heap[child]
+            position[heap[index][1]] = index
+            index = child
+        heap[index] = item
+        position[item[1]] = index
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class _DistanceCache:
+    """
+    LRU cache of dijkstra() results keyed by source vertex
+    - holds at most maxsize distance lists, the least recently used one is dropped first
+    - an edge change only drops the entries whose distances it can alter
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, src):
+        distance = self.entries.get(src)
+        if distance is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(src)
+        self.hits += 1
+        return distance
+
+    def put(self, src, distance):
+        self.entries[src] = distance
+        self.entries.move_to_end(src)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def add_vertices(self, count):
+        # New vertices have no edges yet, so they are unreachable from every cached source.
+        for distance in self.entries.values():
+            distance.extend([float('inf')] * count)
+
+    def edge_changed(self, src, dst, old, new):
+        # An entry goes stale if the edge now gives a shorter way to dst,
+        # or if the old edge was on a shortest path to dst and got longer or removed.
+        for source, distance in list(self.entries.items()):
+            through = distance[src]
+            if through == float('inf'):
+                continue
+            if new != 0 and (old == 0 or new < old) and through + new < distance[dst]:
+                del self.entries[source]
+            elif old != 0 and (new == 0 or new > old) and through + old == distance[dst]:
+                del self.entries[source]
+
+
+class _TopologicalOrder:
+    """
+    Topological order kept up to date while edges are added
+    - order[i] is the vertex in slot i, position[v] is the slot of vertex v
+    - every edge goes from a smaller slot to a larger one
+    """
+
+    def __init__(self, order):
+        self.order = list(order)
+        self.position = [0] * len(self.order)
+        for slot, vertex in enumerate(self.order):
+            self.position[vertex] = slot
+
+    def add_vertices(self, count):
+        # New vertices have no edges, so they can go at the end.
+        for vertex in range(len(self.order), len(self.order) + count):
+            self.position.append(vertex)
+            self.order.append(vertex)
+
+
+class _MatrixView:
+    """
+    Read only adjacency matrix view over any storage
+    - view[src] returns the full row of src as a tuple, so view[src][dst] = weight fails instead of being lost
+    - change edges with add_edge() and remove_edge(), or assign a whole new matrix to adj_matrix
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def __len__(self):
+        return len(self.storage)
+
+    def __getitem__(self, src):
+        return tuple(self.storage.row(src))
+
+    def __iter__(self):
+        for src in range(len(self.storage)):
+            yield tuple(self.storage.row(src))
+
 
 class DirectedGraph:
     """
@@ -15,6 +727,23 @@ class DirectedGraph:
     - vertex names are integers
     """
 
+    _cache = None
+    _topo = None
+    _shared = False
+    # Bumped by every snapshot(), see graph_snapshot.
+    _generation = 0
+    _stats = None
+
+    # Ids freed by remove_vertex(), kept as a set and as a min heap so reuse_vertex() hands out the smallest.
+    _removed = frozenset()
+    _free = ()
+
+    # Methods that are counted and timed while instrumentation is on.
+    _INSTRUMENTED = ('add_vertex', 'add_vertices', 'reuse_vertex', 'add_edge', 'add_edges_bulk', 'remove_edge',
+                     'remove_vertex', 'validate_paths', 'path_weights', 'dfs', 'bfs', 'has_cycle', 'topological_order',
+                     'strongly_connected_components', 'dijkstra', 'shortest_path', 'all_pairs_dijkstra',
+                     'floyd_warshall')
+
     def __init__(self, start_edges=None):
         """
         Store graph info as adjacency matrix
@@ -53,69 +782,282 @@ class DirectedGraph:
 
     # ------------------------------------------------------------------ #
 
+    @property
+    def adj_matrix(self):
+        # The matrix is only a view, the edges live in the storage.
+        return _MatrixView(self._storage)
+
+    @adj_matrix.setter
+    def adj_matrix(self, rows):
+        # Assigning a matrix loads it into dense storage.
+        self._storage = _DenseStorage(rows)
+        self._shared = False
+        self._removed = frozenset()
+        self._free = ()
+        self._edge_count = sum(1 for _ in self._storage.edges())
+        self._topo = None
+        if self._cache is not None:
+            self._cache.clear()
+
+    @classmethod
+    def from_edge_list(cls, edges, storage: str = 'dense', v_count: int = None):
+        # Build a graph from (src, dst[, weight]) rows in one pass.
+        # Without v_count the graph gets as many vertices as the largest index in edges needs.
+        storage_class = _storage_class(storage)
+        edges = list(_edge_rows(edges))
+        if v_count is None:
+            v_count = max((max(src, dst) for src, dst, _ in edges), default=-1) + 1
+
+        edges = [edge for edge in _valid_edges(edges, v_count) if edge[2] != 0]
+        graph = cls()
+        graph.v_count = v_count
+        graph._storage = storage_class.from_edges(v_count, edges)
+        graph._edge_count = len(edges)
+        return graph
+
+    @classmethod
+    def from_edge_file(cls, path, chunk_size: int = 100000, storage: str = 'dense', v_count: int = None):
+        # Build a graph from a text file of "src dst [weight]" lines, see graph_io.read_edge_chunks().
+        # The file is parsed chunk_size lines at a time and every chunk goes through add_edges_bulk().
+        # Without v_count the graph grows to as many vertices as the largest index seen needs.
+        graph = cls.from_edge_list([], storage, v_count or 0)
+        for chunk in read_edge_chunks(path, chunk_size, directed_row):
+            if v_count is None:
+                needed = max(max(src, dst) for src, dst, _ in chunk) + 1
+                if needed > graph.v_count:
+                    graph.add_vertices(needed - graph.v_count)
+            # CSR merges its pending edges whenever they pass a quarter of the arrays, so memory stays
+            # close to the packed size and the merges add up to linear time.
+            graph.add_edges_bulk(chunk)
+        return graph
+
+    def _packed_csr(self):
+        # The edges as a packed _CSRStorage, which is the storage itself when it already is CSR.
+        if self._storage.kind == 'csr':
+            self._storage.packed()
+            return self._storage
+        return _CSRStorage.from_edges(self.v_count, self._storage.edges())
+
+    def save(self, path) -> None:
+        # Write the graph to a binary snapshot file, see graph_io for the layout.
+        csr = self._packed_csr()
+        save_snapshot(path, 'directed', csr.offsets, csr.targets, csr.weights, removed=self._removed)
+
+    @classmethod
+    def load(cls, path, mmap: bool = True):
+        # Read a graph written by save() into CSR storage.
+        # With mmap the arrays stay in the mapped file, so loading takes constant time and processes that
+        # load the same file share its pages. The first write to the arrays copies them into memory.
+        snapshot = load_snapshot(path, 'directed', mmap)
+        storage = _CSRStorage()
+        storage.offsets, storage.targets, storage.weights = snapshot.offsets, snapshot.targets, snapshot.weights
+        storage.mapped = isinstance(snapshot.offsets, memoryview)
+        graph = cls()
+        graph.v_count = snapshot.v_count
+        graph._storage = storage
+        graph._edge_count = len(snapshot.targets)
+        if len(snapshot.removed):
+            graph._removed = set(snapshot.removed)
+            graph._free = sorted(graph._removed)
+        return graph
+
+    @property
+    def storage(self) -> str:
+        return self._storage.kind
+
+    def set_storage(self, kind: str) -> None:
+        # Move every edge into the requested storage ('dense', 'csr' or 'numpy').
+        storage_class = _storage_class(kind)
+        if kind != self._storage.kind:
+            self._storage = storage_class.from_edges(self.v_count, self._storage.edges())
+            self._shared = False
+
+    def _writable(self):
+        # Called before anything changes. If a snapshot still shares the storage, take a private copy first.
+        if self._shared:
+            self._storage = self._storage.copy()
+            if self._removed:
+                self._removed = set(self._removed)
+                self._free = list(self._free)
+            self._shared = False
+
+    def snapshot(self):
+        # Return a read only DirectedSnapshot of the graph as it is now, in O(1) for dense and NumPy storage.
+        # The next change copies the storage, see graph_snapshot.
+        if self._storage.kind == 'csr':
+            # Pending edges are merged now, so packing for bfs_levels() or save() on the snapshot never
+            # rebuilds arrays that another thread is reading.
+            self._storage.packed()
+            if self._storage.reverse is not None:
+                self._storage.reverse.packed()
+        snapshot = DirectedSnapshot.__new__(DirectedSnapshot)
+        snapshot.v_count = self.v_count
+        snapshot._storage = self._storage
+        snapshot._edge_count = self._edge_count
+        snapshot._removed = self._removed
+        snapshot._free = self._free
+        snapshot._token = share(self)
+        return snapshot
+
+    def query_batch(self, queries, workers: int = None) -> []:
+        # Answer each (method name, *args) query, such as ('dijkstra', 0) or ('bfs', 2, 4), against one snapshot()
+        # from a thread pool. The results come back in the order of queries, see graph_snapshot.
+        return query_batch(self, queries, workers)
+
     def add_vertex(self) -> int:
-        # Add 1 to the vertex counter.
+        # Add 1 to the vertex counter and give the new vertex an empty row. Returns the vertex counter,
+        # so the new vertex is the returned value - 1. Ids freed by remove_vertex() are only handed out
+        # again by reuse_vertex().
+        self._writable()
         self.v_count += 1
+        self._storage.add_vertex()
+        if self._cache is not None:
+            self._cache.add_vertices(1)
+        if self._topo is not None:
+            self._topo.add_vertices(1)
+        return self.v_count
 
-        # If the matrix is empty put an empty list in it.
-        if self.v_count == 1:
-            self.adj_matrix.append([])
-        else:
-            # Add a new list to the matrix and fill it in with 0 according to the amount of verticies.
-            self.adj_matrix.append([0 for num in range(self.v_count - 1)])
-
-        # For every exisiting row, add an extra 0 to the end.
-        for vertex in range(0, self.v_count):
-            self.adj_matrix[vertex].append(0)
-        
+    def add_vertices(self, count: int) -> int:
+        # Add count vertices at once, the storage only grows a single time. Returns the vertex counter,
+        # the new vertices are the count ids below it.
+        if count < 0:
+            raise ValueError(f'count must be non-negative, got {count}')
+        self._writable()
+        self.v_count += count
+        self._storage.add_vertices(count)
+        if self._cache is not None:
+            self._cache.add_vertices(count)
+        if self._topo is not None:
+            self._topo.add_vertices(count)
         return self.v_count
 
+    def reuse_vertex(self) -> int:
+        # Bring back the smallest id freed by remove_vertex() as a vertex without edges and return it.
+        # Without a freed id this adds a new vertex like add_vertex(). Either way the new id is returned.
+        self._writable()
+        if not self._free:
+            return self.add_vertex() - 1
+        v = heapq.heappop(self._free)
+        self._removed.discard(v)
+        return v
+
     def add_edge(self, src: int, dst: int, weight=1) -> None:
         # Check if the weight is negative, the src and dst are valid, and if the src and dst are the same.
-        # If they are then do nothing, else update the matrix with the weight.
+        # If they are then do nothing, else update the storage with the weight.
         if weight < 0:
             return
-        if src < 0 or src > len(self.adj_matrix) - 1:
+        if src < 0 or src > self.v_count - 1:
             return
-        if dst < 0 or dst > len(self.adj_matrix) - 1:
+        if dst < 0 or dst > self.v_count - 1:
             return
         if src == dst:
             return
-        
-        self.adj_matrix[src][dst] = weight
+        if self._removed and (src in self._removed or dst in self._removed):
+            return
+
+        self._writable()
+        old = self._storage.get(src, dst)
+        if self._topo is not None and weight != 0 and old == 0:
+            self._topo_insert(src, dst)
+        if self._cache is not None:
+            self._cache.edge_changed(src, dst, old, weight)
+        self._edge_count += int(weight != 0) - int(old != 0)
+        self._storage.set(src, dst, weight)
+
+    def add_edges_bulk(self, edges) -> None:
+        # Validate and dedupe every edge first, then hand the whole batch to the storage at once.
+        # A batch can touch any cached distances, so the cache is emptied.
+        # With cycle detection on, every edge is checked one at a time through add_edge().
+        edges = _valid_edges(_edge_rows(edges), self.v_count)
+        if self._removed:
+            edges = [edge for edge in edges if edge[0] not in self._removed and edge[1] not in self._removed]
+        self._writable()
+        if self._topo is not None:
+            for src, dst, weight in edges:
+                self.add_edge(src, dst, weight)
+            return
+        if self._cache is not None:
+            self._cache.clear()
+        get = self._storage.get
+        for src, dst, weight in edges:
+            self._edge_count += int(weight != 0) - int(get(src, dst) != 0)
+        self._storage.update(edges)
 
     def remove_edge(self, src: int, dst: int) -> None:
         # Check if the src and dst are valid, and if the src and dst are the same.
-        # If they are then do nothing, else update the matrix with the weight to 0.
-        if src < 0 or src > len(self.adj_matrix) - 1:
+        # If they are then do nothing, else update the storage with the weight to 0.
+        if src < 0 or src > self.v_count - 1:
             return
-        if dst < 0 or dst > len(self.adj_matrix) - 1:
+        if dst < 0 or dst > self.v_count - 1:
             return
         if src == dst:
             return
-        
-        self.adj_matrix[src][dst] = 0
+
+        self._writable()
+        old = self._storage.get(src, dst)
+        if self._cache is not None:
+            self._cache.edge_changed(src, dst, old, 0)
+        self._edge_count -= int(old != 0)
+        self._storage.set(src, dst, 0)
+
+    def remove_vertex(self, v: int) -> None:
+        # Remove every edge in or out of v and free its id, which keeps an empty row and column until
+        # reuse_vertex() hands it out again or compact() renumbers the vertices. If v isn't a vertex do nothing.
+        if not self._is_vertex(v):
+            return
+        self._writable()
+        for dst, _ in self._storage.neighbors(v):
+            self.remove_edge(v, dst)
+        for src, _ in self._storage.in_neighbors(v):
+            self.remove_edge(src, v)
+        if not self._removed:
+            self._removed = set()
+            self._free = []
+        self._removed.add(v)
+        heapq.heappush(self._free, v)
+
+    def compact(self) -> dict:
+        # Renumber the vertices 0 to n - 1 in order so the ids freed by remove_vertex() are gone for good.
+        # Returns {old id: new id}. Meant to be run now and then under heavy churn, not after every removal.
+        live = self.get_vertices()
+        mapping = {old: new for new, old in enumerate(live)}
+        if len(live) == self.v_count:
+            return mapping
+
+        edges = [(mapping[src], mapping[dst], weight) for src, dst, weight in self._storage.edges()]
+        self._storage = _storage_class(self._storage.kind).from_edges(len(live), edges)
+        self.v_count = len(live)
+        self._shared = False
+        self._removed = frozenset()
+        self._free = ()
+        if self._cache is not None:
+            self._cache.clear()
+        if self._topo is not None:
+            self.enable_cycle_detection()
+        return mapping
+
+    def _is_vertex(self, v):
+        return 0 <= v < self.v_count and v not in self._removed
 
     def get_vertices(self) -> []:
         # return a list with vertices.
         new_list = []
         for num in range(self.v_count):
-            new_list.append(num)
+            if num not in self._removed:
+                new_list.append(num)
 
         return new_list
 
+    def iter_edges(self):
+        # Yield every (src, dst, weight) one at a time, row by row, without building a list.
+        yield from self._storage.edges()
+
     def get_edges(self) -> []:
-        # Iterate through all the matrices and only append to the new list when the element is not 0.
-        new_list = []
-        row = 0
-        for rows in self.adj_matrix:
-            col = 0
-            for elements in rows:
-                if elements != 0:
-                    new_list.append((row, col, elements))
-                col += 1
-            row += 1
-        return new_list
+        return list(self.iter_edges())
+
+    def edge_count(self) -> int:
+        # The number of edges is kept up to date by every change, so this is O(1).
+        return self._edge_count
 
     def is_valid_path(self, path: []) -> bool:
         # If the path is empty then return True.
@@ -125,7 +1067,7 @@ class DirectedGraph:
         index = 1
         for key in path:
             # If the key is invalid, then return False.
-            if key < 0 or key > len(self.adj_matrix) - 1:
+            if not self._is_vertex(key):
                 return False
 
             # If We have reached the end, return True.
@@ -134,143 +1076,744 @@ class DirectedGraph:
 
             # If the next key is invalid, then return False.
             next = path[index]
-            if next < 0 or next > len(self.adj_matrix) - 1:
+            if next < 0 or next > self.v_count - 1:
                 return False
             
             # If there is no weight for the next spot, then return False.
-            if self.adj_matrix[key][next] == 0:
+            if self._storage.get(key, next) == 0:
                 return False
 
             index += 1
 
-    """ The following DFS and BFS are the exact same as the undirected graph, only accounting for the matrix"""
-    def dfs_helper(self, curr, end, already):
-        if curr == end:
-            return
+    def _path_weight(self, path):
+        # Total weight of the edges along path, or None if is_valid_path() would reject it.
+        get = self._storage.get
+        total = 0
+        previous = None
+        for key in path:
+            if not self._is_vertex(key):
+                return None
+            if previous is not None:
+                weight = get(previous, key)
+                if weight == 0:
+                    return None
+                total += weight
+            previous = key
+        return total
+
+    def validate_paths(self, paths):
+        # Run is_valid_path() on many paths at once. Returns a boolean ndarray with NumPy storage, where every hop
+        # of every path is checked in one vectorized lookup, and a bytearray of 0 or 1 per path otherwise.
+        if self._storage.kind == 'numpy':
+            return self._numpy_path_weights(paths)[0]
+        paths = list(paths)
+        valid = bytearray(len(paths))
+        for number, path in enumerate(paths):
+            valid[number] = self._path_weight(path) is not None
+        return valid
+
+    def path_weights(self, paths):
+        # Return the total edge weight of each path, inf for a path that isn't valid and 0 for an empty one.
+        # The result is a float64 ndarray with NumPy storage and an array('d') otherwise.
+        if self._storage.kind == 'numpy':
+            return self._numpy_path_weights(paths)[1]
+        weights = array('d')
+        for path in paths:
+            total = self._path_weight(path)
+            weights.append(float('inf') if total is None else total)
+        return weights
+
+    def _numpy_path_weights(self, paths):
+        # Vectorized _path_weight() over every path, returns (valid, weights) ndarrays.
+        paths = [list(path) for path in paths]
+        valid = np.ones(len(paths), dtype=bool)
+        lengths = np.array([len(path) for path in paths], dtype=np.int64)
+        flat = np.fromiter((key for path in paths for key in path), dtype=np.int64, count=int(lengths.sum()))
+        path_of = np.repeat(np.arange(len(paths)), lengths)
+
+        # A path with a vertex out of range or removed is invalid.
+        in_range = (flat >= 0) & (flat < self.v_count)
+        if self._removed:
+            in_range &= ~np.isin(flat, list(self._removed))
+        valid[path_of[~in_range]] = False
 
-        if curr not in already:
-            already.append(curr)
+        # Every hop between two in range vertices of the same path needs a weight.
+        hop = (path_of[:-1] == path_of[1:]) & in_range[:-1] & in_range[1:]
+        hop_weights = self._storage.active[flat[:-1][hop], flat[1:][hop]]
+        valid[path_of[:-1][hop][hop_weights == 0]] = False
 
-            curr_list = self.adj_matrix[curr]
-            list_size = len(curr_list)
-            for vertex in range(list_size):
-                if self.adj_matrix[curr][vertex] != 0:
-                    self.dfs_helper(vertex, end, already)
+        # bincount hands back ints when there is no hop at all, so force floats to have room for inf.
+        weights = np.bincount(path_of[:-1][hop], weights=hop_weights, minlength=len(paths)).astype(np.float64)
+        weights[~valid] = np.inf
+        return valid, weights
+
+    """
+    The DFS walks the graph with an explicit stack instead of recursion, so long chains don't hit the recursion limit.
+    state marks a vertex 1 while it is on the stack and 2 once all of its out edges are done.
+    """
+    def _dfs_events(self, v_start, state, counts=None):
+        # Yields ('enter', v) when v is first reached, ('back', v) for an edge to a vertex still on the stack
+        # and ('exit', v) once every out edge of v is done. Out edges are followed in ascending order.
+        # counts, if given, gets [vertices entered, out edges listed] added to it.
+        neighbors = self._storage.neighbors
+        state[v_start] = 1
+        yield 'enter', v_start
+        edges = neighbors(v_start)
+        if counts is not None:
+            counts[0] += 1
+            counts[1] += len(edges)
+        stack = [(v_start, iter(edges))]
+
+        while stack:
+            vertex, edges = stack[-1]
+            for dst, _ in edges:
+                if state[dst] == 0:
+                    state[dst] = 1
+                    yield 'enter', dst
+                    edges = neighbors(dst)
+                    if counts is not None:
+                        counts[0] += 1
+                        counts[1] += len(edges)
+                    stack.append((dst, iter(edges)))
+                    break
+                if state[dst] == 1:
+                    yield 'back', dst
+            else:
+                stack.pop()
+                state[vertex] = 2
+                yield 'exit', vertex
 
     def dfs(self, v_start, v_end=None) -> []:
-        if v_start < 0 or v_start > len(self.adj_matrix) - 1:
+        if not self._is_vertex(v_start):
             return []
 
+        # Record vertices in the order they are entered and stop once the end is reached.
         visit = []
-        self.dfs_helper(v_start, v_end, visit)
+        counts = [0, 0] if self._stats is not None else None
+        for event, vertex in self._dfs_events(v_start, bytearray(self.v_count), counts):
+            if event == 'enter':
+                visit.append(vertex)
+                if vertex == v_end:
+                    break
+        if counts is not None:
+            self._stats.count(*counts)
         return visit
 
 
+    def _bfs_frontier(self, v_start, v_end):
+        # Level by level BFS over the NumPy matrix. The next frontier is the boolean product of the frontier
+        # vector and the matrix, worked out from just the frontier rows. Its vertices are ordered by their
+        # first parent in the current frontier, then by vertex, which is the order the queue visits them in.
+        matrix = self._storage.active
+        visit = np.zeros(self.v_count, dtype=bool)
+        visit[v_start] = True
+        frontier = np.array([v_start])
+        final = []
+
+        while len(frontier):
+            level = frontier.tolist()
+            if v_end in level:
+                level = level[:level.index(v_end) + 1]
+                if self._stats is not None:
+                    self._stats.count(len(level))
+                return final + level
+            final += level
+
+            rows = matrix[frontier] != 0
+            if self._stats is not None:
+                self._stats.count(len(level), int(np.count_nonzero(rows)))
+            reached = np.flatnonzero(rows.any(axis=0) & ~visit)
+            first_parent = rows[:, reached].argmax(axis=0)
+            frontier = reached[np.lexsort((reached, first_parent))]
+            visit[frontier] = True
+
+        return final
+
     def bfs(self, v_start, v_end=None) -> []:
-        if v_start < 0 or v_start > len(self.adj_matrix) - 1:
+        if not self._is_vertex(v_start):
             return []
+        if self._storage.kind == 'numpy':
+            return self._bfs_frontier(v_start, v_end)
 
-        visit = []
-        queue = []
+        # Visited vertices are flagged in a bytearray indexed by vertex.
+        visit = bytearray(self.v_count)
+        queue = deque([v_start])
         final = []
-
-        queue.append(v_start)
-        visit.append(v_start)
+        visit[v_start] = 1
+        scanned = 0
 
         while queue:
-            value = queue.pop(0)
+            value = queue.popleft()
             final.append(value)
 
-            cur_list = self.adj_matrix[value]
-            list_size = len(cur_list)
-            for vertex in range(list_size):
-                if self.adj_matrix[value][vertex] != 0:
-                    if vertex not in visit:
-                        visit.append(vertex)
-                        queue.append(vertex)
-
-        if v_end is not None:
-            if v_end not in final:
-                return final
-            else:
-                for num in range(len(final) - 1, -1, -1):
-                    if final[num] != v_end:
-                        final.pop()
+            if value == v_end:
+                break
+
+            edges = self._storage.neighbors(value)
+            scanned += len(edges)
+            for vertex, _ in edges:
+                if not visit[vertex]:
+                    visit[vertex] = 1
+                    queue.append(vertex)
+
+        if self._stats is not None:
+            self._stats.count(len(final), scanned)
+        return final
+
+    def bfs_levels(self, v_start: int, workers: int = None) -> dict:
+        # Level synchronous BFS from v_start, returns {vertex: level} for the same vertices bfs() reaches,
+        # ordered by level and then by vertex. Each level is expanded top down or bottom up, whichever
+        # is cheaper, and big levels are split across a process pool, see parallel_bfs.
+        if not self._is_vertex(v_start):
+            return {}
+        csr = self._packed_csr()
+        r_offsets, r_sources, _ = csr.packed_reverse()
+        return bfs_levels(csr.offsets, csr.targets, r_offsets, r_sources, v_start, workers)
+
+    def has_cycle(self):
+        # With cycle detection on, add_edge() never lets a cycle in.
+        if self._topo is not None:
+            return False
+
+        # An edge back to a vertex that is still on the DFS stack closes a cycle.
+        state = bytearray(self.v_count)
+        counts = [0, 0] if self._stats is not None else None
+
+        try:
+            for vertex in range(self.v_count):
+                if state[vertex] == 0:
+                    for event, _ in self._dfs_events(vertex, state, counts):
+                        if event == 'back':
+                            return True
+            return False
+        finally:
+            if counts is not None:
+                self._stats.count(*counts)
+
+    def find_cycle(self) -> []:
+        # Return one cycle as a list of vertices that starts and ends with the same vertex, or [] if there is none.
+        state = bytearray(self.v_count)
+
+        for vertex in range(self.v_count):
+            if state[vertex] == 0:
+                # path holds the vertices on the DFS stack, a back edge closes the cycle from its target onwards.
+                path = []
+                for event, num in self._dfs_events(vertex, state):
+                    if event == 'enter':
+                        path.append(num)
+                    elif event == 'exit':
+                        path.pop()
                     else:
-                        return final
+                        return path[path.index(num):] + [num]
+        return []
+
+    def enable_cycle_detection(self) -> None:
+        # Keep a topological order up to date so add_edge() can refuse edges that would close a cycle.
+        # Raises CycleError if the graph already has one.
+        # Drop any old order first so it is worked out from the edges again.
+        # Removed ids have no edges, so they can go anywhere in the order.
+        self._topo = None
+        self._topo = _TopologicalOrder(self.topological_order() + sorted(self._removed))
+
+    def disable_cycle_detection(self) -> None:
+        self._topo = None
+
+    def topological_levels(self) -> []:
+        # Kahn's algorithm one level at a time. Level 0 holds the vertices without in edges, and every
+        # vertex sits one level after the last of its predecessors, so each level can be processed in parallel.
+        # Raises CycleError if the graph has a cycle.
+        indegree = [0] * self.v_count
+        for _, dst, _ in self._storage.edges():
+            indegree[dst] += 1
+
+        levels = []
+        level = [vertex for vertex in range(self.v_count) if indegree[vertex] == 0 and vertex not in self._removed]
+        placed = 0
+        scanned = 0
+        while level:
+            levels.append(level)
+            placed += len(level)
+            following = []
+            for vertex in level:
+                edges = self._storage.neighbors(vertex)
+                scanned += len(edges)
+                for num, _ in edges:
+                    indegree[num] -= 1
+                    if indegree[num] == 0:
+                        following.append(num)
+            level = sorted(following)
+
+        if self._stats is not None:
+            self._stats.count(placed, scanned)
+        if placed < self.v_count - len(self._removed):
+            raise CycleError('the graph has a cycle', self.find_cycle())
+        return levels
+
+    def topological_order(self) -> []:
+        # Return every vertex so that each edge goes from an earlier vertex to a later one.
+        # Raises CycleError if the graph has a cycle.
+        if self._topo is not None:
+            return [vertex for vertex in self._topo.order if vertex not in self._removed]
+        return [vertex for level in self.topological_levels() for vertex in level]
+
+    def strongly_connected_components(self) -> []:
+        # Iterative Tarjan. Returns the components as sorted vertex lists, in topological order of the condensation.
+        # low[v] is the smallest index reachable from v through vertices still on the component stack.
+        index = [-1] * self.v_count
+        low = [0] * self.v_count
+        on_stack = bytearray(self.v_count)
+        stack = []
+        components = []
+        counter = 0
+
+        for root in range(self.v_count):
+            if index[root] != -1 or root in self._removed:
+                continue
+
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [(root, iter(self._storage.neighbors(root)))]
+
+            while work:
+                vertex, edges = work[-1]
+                for num, _ in edges:
+                    if index[num] == -1:
+                        index[num] = low[num] = counter
+                        counter += 1
+                        stack.append(num)
+                        on_stack[num] = 1
+                        work.append((num, iter(self._storage.neighbors(num))))
+                        break
+                    if on_stack[num] and index[num] < low[vertex]:
+                        low[vertex] = index[num]
+                else:
+                    work.pop()
+                    if work and low[vertex] < low[work[-1][0]]:
+                        low[work[-1][0]] = low[vertex]
+
+                    # vertex is the root of a component, everything above it on the stack belongs to it.
+                    if low[vertex] == index[vertex]:
+                        component = []
+                        while True:
+                            num = stack.pop()
+                            on_stack[num] = 0
+                            component.append(num)
+                            if num == vertex:
+                                break
+                        component.sort()
+                        components.append(component)
+
+        # Every vertex got an index and listed each of its out edges once.
+        if self._stats is not None:
+            self._stats.count(counter, self._edge_count)
+
+        # Tarjan finds the components in reverse topological order.
+        components.reverse()
+        return components
+
+    def transitive_closure(self):
+        # Return the reachability matrix, reach[i][j] is True if j can be reached from i.
+        # Every vertex reaches itself and removed ids reach nothing. With NumPy storage this is a boolean ndarray,
+        # built by squaring the matrix until it stops changing. Otherwise it is a list of lists, built by giving every
+        # strongly connected component a bitset of what it reaches, after the bitsets of the components it points to.
+        if self._storage.kind == 'numpy':
+            reach = (self._storage.active != 0) | np.eye(self.v_count, dtype=bool)
+            removed = list(self._removed)
+            reach[removed, removed] = False
+            while True:
+                wider = (reach.astype(np.float32) @ reach.astype(np.float32)) > 0
+                if (wider == reach).all():
+                    return reach
+                reach = wider
+
+        components, dag = self.condensation()
+        component_of = [0] * self.v_count
+        bits = [0] * len(components)
+        for number in range(len(components) - 1, -1, -1):
+            mask = 0
+            for vertex in components[number]:
+                component_of[vertex] = number
+                mask |= 1 << vertex
+            for num, _ in dag._storage.neighbors(number):
+                mask |= bits[num]
+            bits[number] = mask
+
+        return [[bool(bits[component_of[src]] >> dst & 1) for dst in range(self.v_count)]
+                if src not in self._removed else [False] * self.v_count for src in range(self.v_count)]
+
+    def condensation(self) -> tuple:
+        # Collapse every strongly connected component into one vertex and return (components, dag).
+        # Vertex i of dag stands for components[i] and the vertices are numbered in topological order.
+        # An edge between two components keeps the smallest weight of the edges it replaces.
+        components = self.strongly_connected_components()
+        component_of = [0] * self.v_count
+        for number, component in enumerate(components):
+            for vertex in component:
+                component_of[vertex] = number
+
+        edges = {}
+        for src, dst, weight in self._storage.edges():
+            key = (component_of[src], component_of[dst])
+            if key[0] != key[1] and weight < edges.get(key, float('inf')):
+                edges[key] = weight
+
+        dag = DirectedGraph.from_edge_list([(src, dst, weight) for (src, dst), weight in edges.items()],
+                                           storage=self.storage, v_count=len(components))
+        return components, dag
+
+    def _topo_insert(self, src, dst):
+        # Pearce-Kelly: only the vertices between dst and src in the order can be affected by the edge src -> dst.
+        position, order = self._topo.position, self._topo.order
+        lower, upper = position[dst], position[src]
+        if lower > upper:
+            return
+
+        # Search forward from dst through vertices placed before src. Reaching src means a cycle.
+        parent = {dst: -1}
+        forward = []
+        stack = [dst]
+        while stack:
+            vertex = stack.pop()
+            forward.append(vertex)
+            for num, _ in self._storage.neighbors(vertex):
+                if num == src:
+                    path = [vertex]
+                    while parent[path[-1]] != -1:
+                        path.append(parent[path[-1]])
+                    path.reverse()
+                    raise CycleError(f'edge {src} -> {dst} would create a cycle', [src] + path + [src])
+                if num not in parent and position[num] < upper:
+                    parent[num] = vertex
+                    stack.append(num)
+
+        # Search backward from src through vertices placed after dst.
+        seen = {src}
+        backward = []
+        stack = [src]
+        while stack:
+            vertex = stack.pop()
+            backward.append(vertex)
+            for num, _ in self._storage.in_neighbors(vertex):
+                if num not in seen and position[num] > lower:
+                    seen.add(num)
+                    stack.append(num)
+
+        # Hand the slots of both groups back out, the backward group first and each group in its old order.
+        forward.sort(key=position.__getitem__)
+        backward.sort(key=position.__getitem__)
+        affected = backward + forward
+        slots = sorted(position[vertex] for vertex in affected)
+        for vertex, slot in zip(affected, slots):
+            position[vertex] = slot
+            order[slot] = vertex
+
+
+    def _dijkstra_search(self, src, dst=None):
+        # Fill in a list of distances where every vertex starts at inf and the source is 0.
+        # previous[v] is the vertex before v on the shortest path, or -1.
+        distance = [float('inf')] * self.v_count
+        previous = [-1] * self.v_count
+        distance[src] = 0
+
+        # Every vertex sits in the heap once, a shorter path lowers its key instead of pushing a duplicate.
+        heap = _IndexedHeap()
+        heap.push(src, 0)
+        relaxed = 0
+
+        while heap:
+            # Pop the closest vertex, its distance is final. Stop once the destination is settled.
+            dist, vertex = heap.pop()
+            if vertex == dst:
+                break
+
+            # Add the weight of every out edge to the current path and keep the shorter ones.
+            edges = self._storage.neighbors(vertex)
+            relaxed += len(edges)
+            for num, weight in edges:
+                total_distance = dist + weight
+                if total_distance < distance[num]:
+                    distance[num] = total_distance
+                    previous[num] = vertex
+                    heap.push(num, total_distance)
+
+        if self._stats is not None:
+            self._stats.count(heap.pops, relaxed, heap.pushes, heap.pops)
+        return distance, previous
+
+    def _dijkstra_all(self, src):
+        # Full single source run for dijkstra(). Every reachable vertex is settled anyway, so heapq with stale
+        # entries skipped is cheaper than lowering keys in an _IndexedHeap, which only pays off with early exit.
+        # CSR storage is packed first and searched straight over its arrays.
+        counts = [0, 0, 0] if self._stats is not None else None
+        if self._storage.kind == 'csr':
+            distance = _csr_dijkstra(*self._storage.packed(), src, counts)
+            if self._storage.typecode == 'd':
+                distance = _integral(distance)
         else:
-            return final
-            
-    """ 
-    Is the same exact as the undirected graph, but instead of tracking the parent vertex we have a stack to keep 
-    track of the vertices in the recursion. Since the directed graph has directions and cannot loop back.
-    
-    """
-    def has_cycle_helper(self, curr, track, already):
-        if curr not in already:
-            already.append(curr)
-        
-        track.append(curr)
-
-        curr_list = self.adj_matrix[curr]
-        list_size = len(curr_list)
-
-        for num in range(list_size):
-            if self.adj_matrix[curr][num] != 0:
-                if num not in already:
-                    if self.has_cycle_helper(num, track, already):
-                        return True
-                elif num in track:
-                    return True
-
-        track.remove(curr)
-        return False
+            distance = [float('inf')] * self.v_count
+            distance[src] = 0
+            heap_list = [(0, src)]
+            neighbors = self._storage.neighbors
+            settled = relaxed = 0
+            pushes = 1
 
-    def has_cycle(self):
-        visit = []
-        track = []
-        vertices = self.get_vertices()
+            while heap_list:
+                dist, vertex = heapq.heappop(heap_list)
+                if dist > distance[vertex]:
+                    continue
+                edges = neighbors(vertex)
+                settled += 1
+                relaxed += len(edges)
+                for num, weight in edges:
+                    total_distance = dist + weight
+                    if total_distance < distance[num]:
+                        distance[num] = total_distance
+                        heapq.heappush(heap_list, (total_distance, num))
+                        pushes += 1
 
-        for vertex in vertices:
-            if vertex not in visit:
-                if self.has_cycle_helper(vertex, track, visit):
-                    return True
-        return False
+            if counts is not None:
+                counts[:] = settled, relaxed, pushes
 
+        # Every entry pushed is popped again before the heap runs dry.
+        if counts is not None:
+            self._stats.count(counts[0], counts[1], counts[2], counts[2])
+        return distance
 
     def dijkstra(self, src: int) -> []:
-        # Fill in a list of distanced where every vertices has the work inf and the current source is 0
-        new_list = [float('inf') for vertex in range(len(self.adj_matrix))]
-        new_list[src] = 0
-
-        # Load a heap tuple with (DISTANCE, SOURCE)
-        heap_list = [(0, src)]
-
-        while len(heap_list) > 0:
-            # Pop the tutple and get the distance and the vertex
-            distance, vertex = heapq.heappop(heap_list)
-
-            # If the current distance is less than or equal to the value in the new_list, then check for paths.
-            if distance <= new_list[vertex]:
-                
-                # Get the list of adj vertices
-                curr_list = self.adj_matrix[vertex]
-                list_size = len(curr_list)
-
-                # Iterate through adj vertices that have weights.
-                # Add the weight by the current path.
-                for num in range(list_size):
-                    weight = self.adj_matrix[vertex][num]
-                    if weight != 0:
-                        total_distance = distance + weight
-
-                        # If the new updated distance is greater than the distance in new_list update, update it in new_list and push this back into the heap.
-                        # else ignore the update.
-                        if total_distance < new_list[num]:
-                            new_list[num] = total_distance
-                            heapq.heappush(heap_list, (total_distance, num))
-    
-        return new_list
+        # Return the shortest distance from src to every vertex, inf if it can't be reached.
+        # With the cache enabled, the result for src is reused until an edge change affects it.
+        if self._cache is None:
+            return self._dijkstra_all(src)
+
+        distance = self._cache.get(src)
+        if distance is None:
+            distance = self._dijkstra_all(src)
+            self._cache.put(src, distance)
+        return list(distance)
+
+    def all_pairs_dijkstra(self, sources=None, workers=None) -> DistanceMatrix:
+        # Run dijkstra() from every vertex in sources (all vertices by default) and collect the rows.
+        # With more than one worker and at least PARALLEL_MIN work the sources are split across a process pool.
+        # The edges are written once to a temporary snapshot file that every worker memory maps read only.
+        sources = list(range(self.v_count)) if sources is None else list(sources)
+        for src in sources:
+            if src < 0 or src > self.v_count - 1:
+                raise ValueError(f'source {src} is not a vertex of the graph')
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        csr = self._packed_csr()
+        data = array('d')
+        if workers <= 1 or len(sources) < 2 or len(sources) * (self.v_count + self._edge_count) < PARALLEL_MIN:
+            for src in sources:
+                data.extend(_csr_dijkstra(csr.offsets, csr.targets, csr.weights, src))
+            return DistanceMatrix(sources, self.v_count, data)
+
+        with tempfile.NamedTemporaryFile(suffix='.graph', delete=False) as f:
+            pass
+        try:
+            save_snapshot(f.name, 'directed', csr.offsets, csr.targets, csr.weights)
+            size = max(1, len(sources) // (workers * 4))
+            chunks = [sources[start:start + size] for start in range(0, len(sources), size)]
+            with ProcessPoolExecutor(workers, initializer=_open_shared_csr, initargs=(f.name,)) as pool:
+                for rows in pool.map(_dijkstra_rows, chunks):
+                    data.frombytes(rows)
+        finally:
+            os.remove(f.name)
+        return DistanceMatrix(sources, self.v_count, data)
+
+    def floyd_warshall(self) -> DistanceMatrix:
+        # All pairs shortest distances in O(V^3), meant for small dense graphs.
+        # Every step relaxes whole rows at once, with NumPy when it is installed.
+        n = self.v_count
+        rows = [[float('inf')] * n for _ in range(n)]
+        for v in range(n):
+            rows[v][v] = 0
+        for src, dst, weight in self._storage.edges():
+            rows[src][dst] = weight
+
+        data = array('d')
+        if np is not None and n > 0:
+            dist = np.array(rows, dtype=float)
+            for k in range(n):
+                np.minimum(dist, dist[:, k, None] + dist[None, k, :], out=dist)
+            data.frombytes(dist.tobytes())
+        else:
+            for k in range(n):
+                row_k = rows[k]
+                for i in range(n):
+                    d_ik = rows[i][k]
+                    if d_ik != float('inf'):
+                        rows[i] = list(map(min, rows[i], [d_ik + weight for weight in row_k]))
+            for row in rows:
+                data.extend(row)
+        return DistanceMatrix(range(n), n, data)
+
+    def enable_dijkstra_cache(self, maxsize: int = 128) -> None:
+        # Start caching dijkstra() results for up to maxsize sources.
+        if maxsize < 1:
+            raise ValueError(f'maxsize must be at least 1, got {maxsize}')
+        self._cache = _DistanceCache(maxsize)
+
+    def disable_dijkstra_cache(self) -> None:
+        self._cache = None
+
+    def dijkstra_cache_info(self) -> CacheInfo:
+        # Return (hits, misses, maxsize, currsize) like functools.lru_cache, or None if the cache is off.
+        if self._cache is None:
+            return None
+        return CacheInfo(self._cache.hits, self._cache.misses, self._cache.maxsize, len(self._cache.entries))
+
+    def enable_instrumentation(self, callback=None) -> GraphStats:
+        # Count and time the methods in _INSTRUMENTED, see graph_stats.
+        return enable_instrumentation(self, callback)
+
+    def disable_instrumentation(self) -> None:
+        disable_instrumentation(self)
+
+    def stats(self) -> GraphStats:
+        # The GraphStats of the instrumentation, or None while it is off.
+        return self._stats
+
+    def _bidirectional_search(self, src, dst):
+        # Search forward from src over the out edges and backward from dst over the in edges at the same time.
+        # best is the shortest src -> dst distance seen through a vertex reached from both sides, at meet.
+        # previous[1][v] is the vertex after v on the way to dst.
+        steps = (self._storage.neighbors, self._storage.in_neighbors)
+        distance = ({src: 0}, {dst: 0})
+        previous = ({src: -1}, {dst: -1})
+        heaps = (_IndexedHeap(), _IndexedHeap())
+        heaps[0].push(src, 0)
+        heaps[1].push(dst, 0)
+        best, meet = (0, src) if src == dst else (float('inf'), -1)
+        relaxed = 0
+
+        while heaps[0] and heaps[1]:
+            # Once the two closest unsettled vertices add up to best, no shorter path is left.
+            forward, backward = heaps[0].heap[0][0], heaps[1].heap[0][0]
+            if forward + backward >= best:
+                break
+
+            # Always grow the side with the closer frontier.
+            side = 0 if forward <= backward else 1
+            dist, vertex = heaps[side].pop()
+            other = distance[1 - side]
+            edges = steps[side](vertex)
+            relaxed += len(edges)
+            for num, weight in edges:
+                total_distance = dist + weight
+                if total_distance < distance[side].get(num, float('inf')):
+                    distance[side][num] = total_distance
+                    previous[side][num] = vertex
+                    heaps[side].push(num, total_distance)
+                if num in other and total_distance + other[num] < best:
+                    best = total_distance + other[num]
+                    meet = num
+
+        if self._stats is not None:
+            pops = heaps[0].pops + heaps[1].pops
+            self._stats.count(pops, relaxed, heaps[0].pushes + heaps[1].pushes, pops)
+        if meet == -1:
+            return best, []
+
+        # Join the forward path up to meet with the backward path from meet to dst.
+        path = self._build_path(previous[0], meet)
+        vertex = previous[1][meet]
+        while vertex != -1:
+            path.append(vertex)
+            vertex = previous[1][vertex]
+        return best, path
+
+    def _astar_search(self, src, dst, heuristic):
+        # Same as Dijkstra, but the heap is keyed by the distance so far plus heuristic(v, dst).
+        # Distances are kept in dicts so only the vertices the search touches cost anything.
+        distance = {src: 0}
+        previous = {src: -1}
+        heap = _IndexedHeap()
+        heap.push(src, heuristic(src, dst))
+        relaxed = 0
+
+        while heap:
+            _, vertex = heap.pop()
+            if vertex == dst:
+                break
+
+            # A vertex is pushed again if a shorter path to it shows up after it was popped.
+            edges = self._storage.neighbors(vertex)
+            relaxed += len(edges)
+            for num, weight in edges:
+                total_distance = distance[vertex] + weight
+                if total_distance < distance.get(num, float('inf')):
+                    distance[num] = total_distance
+                    previous[num] = vertex
+                    heap.push(num, total_distance + heuristic(num, dst))
+
+        if self._stats is not None:
+            self._stats.count(heap.pops, relaxed, heap.pushes, heap.pops)
+        if dst not in distance:
+            return float('inf'), []
+        return distance[dst], self._build_path(previous, dst)
+
+    def _build_path(self, previous, dst):
+        # Walk the predecessors back from dst until -1 and reverse them into a path.
+        path = [dst]
+        while previous[path[-1]] != -1:
+            path.append(previous[path[-1]])
+        path.reverse()
+        return path
+
+    def shortest_path(self, src: int, dst: int, method: str = 'dijkstra', heuristic=None) -> tuple:
+        # Return (distance, path) for the shortest path from src to dst, (inf, []) means there is no path.
+        # method is 'dijkstra', 'bidirectional' or 'astar'. For 'astar', heuristic(v, dst) must never
+        # overestimate the distance from v to dst.
+        if method not in ('dijkstra', 'bidirectional', 'astar'):
+            raise ValueError(f"unknown method {method!r}, expected 'dijkstra', 'bidirectional' or 'astar'")
+        if method == 'astar' and heuristic is None:
+            raise ValueError("method 'astar' needs a heuristic")
+        if not self._is_vertex(src) or not self._is_vertex(dst):
+            return float('inf'), []
+
+        if method == 'bidirectional':
+            return self._bidirectional_search(src, dst)
+        if method == 'astar':
+            return self._astar_search(src, dst, heuristic)
+
+        # The search stops as soon as dst is settled.
+        distance, previous = self._dijkstra_search(src, dst)
+        if distance[dst] == float('inf'):
+            return distance[dst], []
+        return distance[dst], self._build_path(previous, dst)
+
+
+class DirectedSnapshot(DirectedGraph):
+    """
+    Read only copy of a DirectedGraph, returned by DirectedGraph.snapshot()
+    - shares the storage with the graph until the graph changes
+    - every change raises TypeError
+    - the distance cache and cycle detection stay off, so queries never write shared state
+    """
+
+    adj_matrix = property(DirectedGraph.adj_matrix.fget)
+
+    def _writable(self):
+        raise TypeError('a graph snapshot is read only')
+
+    def set_storage(self, kind: str) -> None:
+        self._writable()
+
+    def compact(self) -> dict:
+        self._writable()
+
+    def enable_cycle_detection(self) -> None:
+        self._writable()
+
+    def enable_dijkstra_cache(self, maxsize: int = 128) -> None:
+        self._writable()
+
+    def snapshot(self):
+        return self
 
 
 if __name__ == '__main__':
@@ -347,3 +1890,11 @@ if __name__ == '__main__':
     print('\n', g)
     for i in range(5):
         print(f'DIJKSTRA {i} {g.dijkstra(i)}')
+
+
+    print("\nNumPy rows and weights example")
+    print("------------------------------")
+    if np is not None:
+        g = DirectedGraph(np.array([[0, 1, 10], [4, 0, 12], [1, 4, 15]]))
+        g.add_edge(0, 2, np.float64(2.5))
+        print(g, g.edge_count())
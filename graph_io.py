@@ -0,0 +1,158 @@
+# Course: CS261 - Data Structures
+# Author: Alexander Shen
+# Assignment: 6
+# Description: Binary snapshot format shared by the undirected and the directed graph.
+
+import gzip
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from itertools import islice
+from mmap import ACCESS_READ, mmap as map_file
+
+"""
+A snapshot stores the graph in compressed sparse row form. Every section starts on an 8 byte boundary
+and all numbers are little endian.
+
+  header   magic b'GRPH', format version, graph kind, weight typecode, vertex count, entry count,
+           removed count
+  offsets  vertex count + 1 int64, the entries of vertex v are targets[offsets[v]:offsets[v + 1]]
+  targets  entry count int64
+  weights  entry count int64 ('q') or float64 ('d'), directed graphs only
+  removed  removed count int64, the ids of removed vertices of a directed graph
+  names    vertex count + 1 int64 offsets into the UTF-8 names that follow, undirected graphs only
+
+An undirected graph stores every edge at both ends, so its entry count is twice its edge count.
+Version 1 files have no removed count in the header and no removed section, they are still read.
+"""
+
+MAGIC = b'GRPH'
+VERSION = 2
+KINDS = {'directed': 0, 'undirected': 1}
+
+_HEADERS = {1: struct.Struct('<4sHBBQQ'), 2: struct.Struct('<4sHBBQQQ')}
+
+Snapshot = namedtuple('Snapshot', ['v_count', 'offsets', 'targets', 'weights', 'names', 'removed'])
+
+
+def _pad(f):
+    # Fill the file up to the next 8 byte boundary.
+    f.write(b'\0' * (-f.tell() % 8))
+
+
+def _write_array(f, values):
+    # values is an array or the memoryview of a loaded snapshot.
+    if sys.byteorder != 'little':
+        values = array(memoryview(values).format, memoryview(values).tobytes())
+        values.byteswap()
+    f.write(values)
+    _pad(f)
+
+
+def save_snapshot(path, kind, offsets, targets, weights=None, names=None, removed=()):
+    # Write one graph, offsets, targets and removed hold int64 values, weights int64 or float64 values.
+    encoded = [name.encode('utf-8') for name in names] if names is not None else None
+    typecode = ord(memoryview(weights).format) if weights is not None else 0
+    header = _HEADERS[VERSION]
+    with open(path, 'wb') as f:
+        f.write(header.pack(MAGIC, VERSION, KINDS[kind], typecode, len(offsets) - 1, len(targets), len(removed)))
+        _pad(f)
+        _write_array(f, offsets)
+        _write_array(f, targets)
+        if weights is not None:
+            _write_array(f, weights)
+        if removed:
+            _write_array(f, array('q', sorted(removed)))
+        if encoded is not None:
+            name_offsets = array('q', [0])
+            for name in encoded:
+                name_offsets.append(name_offsets[-1] + len(name))
+            _write_array(f, name_offsets)
+            f.write(b''.join(encoded))
+
+
+def load_snapshot(path, kind, use_mmap=True):
+    # Read a graph written by save_snapshot().
+    # With use_mmap the arrays are read only memoryviews straight over the mapped file, so opening is
+    # instant and processes that map the same file share its pages. Otherwise they are copied into arrays.
+    with open(path, 'rb') as f:
+        if use_mmap and sys.byteorder == 'little':
+            buffer = memoryview(map_file(f.fileno(), 0, access=ACCESS_READ))
+        else:
+            buffer = memoryview(f.read())
+            use_mmap = False
+
+    magic, version = struct.unpack_from('<4sH', buffer)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a graph snapshot')
+    if version not in _HEADERS:
+        raise ValueError(f'{path} has snapshot version {version}, expected at most {VERSION}')
+    header = _HEADERS[version]
+    _, _, stored_kind, typecode, v_count, e_count, *rest = header.unpack_from(buffer)
+    r_count = rest[0] if rest else 0
+    if stored_kind != KINDS[kind]:
+        raise ValueError(f'{path} does not hold a {kind} graph')
+
+    position = header.size + (-header.size % 8)
+
+    def section(typecode, count):
+        # Cut the next section out of the buffer and step past its padding.
+        nonlocal position
+        start, position = position, position + 8 * count
+        part = buffer[start:position].cast(typecode)
+        if not use_mmap:
+            part = array(typecode, part.tobytes())
+            if sys.byteorder != 'little':
+                part.byteswap()
+        return part
+
+    offsets = section('q', v_count + 1)
+    targets = section('q', e_count)
+    weights = section(chr(typecode), e_count) if typecode else None
+    removed = section('q', r_count)
+
+    names = None
+    if kind == 'undirected':
+        name_offsets = section('q', v_count + 1)
+        blob = buffer[position:position + name_offsets[-1]]
+        names = [str(blob[name_offsets[v]:name_offsets[v + 1]], 'utf-8') for v in range(v_count)]
+
+    return Snapshot(v_count, offsets, targets, weights, names, removed)
+
+
+def _number(text):
+    # Edge weights are read as int when they look like one, otherwise as float.
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def directed_row(fields):
+    # (src, dst[, weight]) from the fields of one line, the weight defaults to 1.
+    return int(fields[0]), int(fields[1]), _number(fields[2]) if len(fields) > 2 else 1
+
+
+def undirected_row(fields):
+    # (u, v) from the fields of one line, the vertex names are kept as strings.
+    return fields[0], fields[1]
+
+
+def read_edge_chunks(path, chunk_size, parse):
+    # Yield the edges of a text edge list as lists of at most chunk_size rows, so only one chunk is in memory.
+    # Fields are separated by whitespace or commas, blank lines and lines starting with # are skipped.
+    # Files starting with the gzip magic bytes are decompressed on the fly.
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be at least 1')
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    opener = gzip.open if compressed else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        lines = (line.replace(',', ' ').split() for line in f)
+        rows = (parse(fields) for fields in lines if fields and not fields[0].startswith('#'))
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
@@ -0,0 +1,64 @@
+# Course: CS261 - Data Structures
+# Author: Alexander Shen
+# Assignment: 6
+# Description: Read only snapshots and batched queries, shared by both graphs.
+
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+"""
+snapshot() hands out the structures of a graph without copying them and marks the graph shared. The first
+change made to the graph afterwards copies them, so threads can query the snapshot without locks while the
+graph keeps changing. Take snapshots on the thread that changes the graph, only the snapshot itself is safe
+to share.
+
+Every snapshot() bumps the generation of its graph. query_batch() only needs its snapshot while the pool runs,
+so afterwards it clears the shared flag again, but only if the flag was clear before its snapshot and no other
+snapshot was issued since. Then the next change doesn't pay for a copy of the whole graph, which is the V^2
+matrix with dense storage, while any other snapshot still keeps the copy on write it relies on.
+"""
+
+# Guards the shared flag and the generation between snapshot() and release() on different threads.
+_lock = Lock()
+
+
+def share(graph):
+    # Mark graph shared for a new snapshot. Returns the token release() needs, or None if the structures
+    # were already shared with an earlier snapshot.
+    with _lock:
+        graph._generation += 1
+        token = None if graph._shared else graph._generation
+        graph._shared = True
+        return token
+
+
+def release(graph, token):
+    # The snapshot of token is gone. Clear the shared flag unless another snapshot was issued after it.
+    with _lock:
+        if token is not None and graph._generation == token:
+            graph._shared = False
+
+
+def query_batch(graph, queries, workers=None):
+    # Answer each (method name, *args) query of queries from a thread pool, against one snapshot of graph.
+    # The results come back in the order of queries, iterators are read into lists before the pool ends.
+    snapshot = graph.snapshot()
+    try:
+        calls = []
+        for name, *args in queries:
+            method = getattr(snapshot, name, None)
+            if name.startswith('_') or name == 'snapshot' or not callable(method):
+                raise ValueError(f'{name} is not a query')
+            calls.append((method, args))
+        with ThreadPoolExecutor(workers) as pool:
+            return list(pool.map(_answer, calls))
+    finally:
+        if snapshot is not graph:
+            release(graph, snapshot._token)
+
+
+def _answer(call):
+    method, args = call
+    result = method(*args)
+    return list(result) if isinstance(result, Iterator) else result
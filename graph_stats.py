@@ -0,0 +1,101 @@
+# Course: CS261 - Data Structures
+# Author: Alexander Shen
+# Assignment: 6
+# Description: Opt in counters and timers for the undirected and the directed graph.
+
+from time import perf_counter
+
+COUNTERS = ('vertices_visited', 'edges_relaxed', 'heap_pushes', 'heap_pops')
+
+
+class GraphStats:
+    """
+    Counters and timers filled in while a graph has instrumentation on
+    - vertices_visited, edges_relaxed, heap_pushes and heap_pops add up over every instrumented call
+    - the traversals count the vertices they reach and the edges they scan, the shortest path searches the
+      vertices they settle and the edges they relax
+    - calls[name] and seconds[name] hold the number of calls and the total wall time of each method
+    - every function in callbacks is called as callback(name, seconds, counts) after each instrumented call,
+      where counts holds the counters of that call alone
+    """
+
+    def __init__(self):
+        self.callbacks = []
+        self.reset()
+
+    def reset(self):
+        self.vertices_visited = 0
+        self.edges_relaxed = 0
+        self.heap_pushes = 0
+        self.heap_pops = 0
+        self.calls = {}
+        self.seconds = {}
+
+    def count(self, vertices_visited=0, edges_relaxed=0, heap_pushes=0, heap_pops=0):
+        # Called by the algorithms once per run with what they did.
+        self.vertices_visited += vertices_visited
+        self.edges_relaxed += edges_relaxed
+        self.heap_pushes += heap_pushes
+        self.heap_pops += heap_pops
+
+    def totals(self):
+        return tuple(getattr(self, name) for name in COUNTERS)
+
+    def as_dict(self):
+        out = dict(zip(COUNTERS, self.totals()))
+        out['calls'] = dict(self.calls)
+        out['seconds'] = dict(self.seconds)
+        return out
+
+    def __repr__(self):
+        counters = ', '.join(f'{name}={value}' for name, value in zip(COUNTERS, self.totals()))
+        return f'GraphStats({counters}, calls={self.calls})'
+
+
+def _timed(stats, name, method):
+    # Wrap a bound method so every call is counted and timed, the algorithms fill in the counters themselves.
+    def timed(*args, **kwargs):
+        before = stats.totals()
+        start = perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            seconds = perf_counter() - start
+            stats.calls[name] = stats.calls.get(name, 0) + 1
+            stats.seconds[name] = stats.seconds.get(name, 0.0) + seconds
+            if stats.callbacks:
+                counts = {counter: after - old for counter, after, old in zip(COUNTERS, stats.totals(), before)}
+                for callback in stats.callbacks:
+                    callback(name, seconds, counts)
+
+    return timed
+
+
+def instrument(graph, names):
+    # Shadow each method in names with a timed wrapper set on the graph itself. The class is left alone,
+    # so graphs without instrumentation run exactly the same code as before.
+    for name in names:
+        method = getattr(type(graph), name).__get__(graph)
+        setattr(graph, name, _timed(graph._stats, name, method))
+
+
+def uninstrument(graph, names):
+    # Drop the wrappers, calls go straight to the class methods again.
+    for name in names:
+        graph.__dict__.pop(name, None)
+
+
+def enable_instrumentation(graph, callback=None):
+    # Start counting and timing the methods in graph._INSTRUMENTED and return the GraphStats they fill in.
+    # callback(name, seconds, counts) is called after every instrumented call.
+    if graph._stats is None:
+        graph._stats = GraphStats()
+        instrument(graph, graph._INSTRUMENTED)
+    if callback is not None:
+        graph._stats.callbacks.append(callback)
+    return graph._stats
+
+
+def disable_instrumentation(graph):
+    uninstrument(graph, graph._INSTRUMENTED)
+    graph._stats = None
@@ -0,0 +1,164 @@
+# Course: CS261 - Data Structures
+# Author: Alexander Shen
+# Assignment: 6
+# Description: Level synchronous, direction optimizing BFS over CSR arrays, shared by both graphs.
+
+import os
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing.shared_memory import SharedMemory
+
+from graph_io import load_snapshot, save_snapshot
+
+"""
+Every level is expanded either top down, where the frontier vertices look at their out edges, or bottom up,
+where every unvisited vertex looks at its in edges for a frontier vertex and stops at the first one. Bottom up
+wins once the frontier is a large part of the graph. The switch follows Beamer et al.: go bottom up when the
+frontier has more than 1/ALPHA of the unexplored edges, back to top down when it holds fewer than 1/BETA of
+the vertices.
+
+With a process pool the frontier (top down) or the vertex range (bottom up) of each level is split across
+the workers. They memory map the adjacency from snapshot files and read the levels from shared memory,
+which only the calling process writes, between levels.
+"""
+
+ALPHA = 14
+BETA = 24
+
+# Smaller frontiers and graphs are expanded in the calling process, a round trip to the pool costs more.
+PARALLEL_MIN = 4096
+
+# (offsets, targets, reverse offsets, reverse sources, levels) of the graph a pool worker is serving.
+_worker_state = None
+_worker_memory = None
+
+
+def _top_down(state, frontier):
+    # Unvisited out neighbours of the frontier, possibly with repeats.
+    offsets, targets, _, _, levels = state
+    found = array('q')
+    for v in frontier:
+        for index in range(offsets[v], offsets[v + 1]):
+            if levels[targets[index]] == -1:
+                found.append(targets[index])
+    return found
+
+
+def _bottom_up(state, lo, hi, depth):
+    # Unvisited vertices in [lo, hi) with an in neighbour at depth, in ascending order.
+    _, _, r_offsets, r_sources, levels = state
+    found = array('q')
+    for v in range(lo, hi):
+        if levels[v] == -1:
+            for index in range(r_offsets[v], r_offsets[v + 1]):
+                if levels[r_sources[index]] == depth:
+                    found.append(v)
+                    break
+    return found
+
+
+def _open_state(forward, reverse, levels_name):
+    # Pool initializer, maps both snapshots read only and attaches to the shared levels.
+    global _worker_state, _worker_memory
+    out_edges = load_snapshot(forward, 'directed')
+    in_edges = load_snapshot(reverse, 'directed')
+    _worker_memory = SharedMemory(levels_name)
+    _worker_state = (out_edges.offsets, out_edges.targets, in_edges.offsets, in_edges.targets,
+                     _worker_memory.buf.cast('q'))
+
+
+def _top_down_task(frontier):
+    return _top_down(_worker_state, array('q', frontier)).tobytes()
+
+
+def _bottom_up_task(lo, hi, depth):
+    return _bottom_up(_worker_state, lo, hi, depth).tobytes()
+
+
+def _expand(state, frontier, depth, bottom_up, pool, workers):
+    # Run one level in the calling process or split it across the pool.
+    v_count = len(state[0]) - 1
+    if bottom_up:
+        if pool is None or v_count < PARALLEL_MIN:
+            return _bottom_up(state, 0, v_count, depth)
+        size = -(-v_count // (workers * 4))
+        starts = range(0, v_count, size)
+        parts = pool.map(_bottom_up_task, starts, [min(start + size, v_count) for start in starts], repeat(depth))
+    else:
+        if pool is None or len(frontier) < PARALLEL_MIN:
+            return _top_down(state, frontier)
+        size = -(-len(frontier) // (workers * 4))
+        chunks = [array('q', frontier[start:start + size]).tobytes() for start in range(0, len(frontier), size)]
+        parts = pool.map(_top_down_task, chunks)
+    found = array('q')
+    for part in parts:
+        found.frombytes(part)
+    return found
+
+
+def _search(state, start, pool=None, workers=1):
+    offsets, targets, _, _, levels = state
+    v_count = len(offsets) - 1
+    levels[start] = 0
+    result = {start: 0}
+    frontier = [start]
+    unexplored = len(targets) - (offsets[start + 1] - offsets[start])
+    depth = 0
+    bottom_up = False
+
+    while frontier:
+        frontier_edges = sum(offsets[v + 1] - offsets[v] for v in frontier)
+        if not bottom_up and frontier_edges * ALPHA > unexplored:
+            bottom_up = True
+        elif bottom_up and len(frontier) * BETA < v_count:
+            bottom_up = False
+
+        found = _expand(state, frontier, depth, bottom_up, pool, workers)
+
+        # Only this process writes levels, and only between levels while no worker is reading them.
+        depth += 1
+        frontier = []
+        for v in found:
+            if levels[v] == -1:
+                levels[v] = depth
+                frontier.append(v)
+                unexplored -= offsets[v + 1] - offsets[v]
+        frontier.sort()
+        result.update(dict.fromkeys(frontier, depth))
+
+    return result
+
+
+def bfs_levels(offsets, targets, r_offsets, r_sources, start, workers=None):
+    # Return {vertex: level} for every vertex reachable from start, ordered by level and then by vertex.
+    # offsets/targets are the out edges in CSR form, r_offsets/r_sources the in edges. An undirected graph
+    # passes the same arrays twice. With more than one worker big levels are split across a process pool.
+    v_count = len(offsets) - 1
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or v_count < PARALLEL_MIN:
+        return _search((offsets, targets, r_offsets, r_sources, array('q', [-1]) * v_count), start)
+
+    paths = []
+    memory = SharedMemory(create=True, size=8 * v_count)
+    levels = memory.buf.cast('q')
+    try:
+        # Every byte of -1 as an int64 is 0xff.
+        memory.buf[:8 * v_count] = b'\xff' * (8 * v_count)
+        for arrays in ((offsets, targets), (r_offsets, r_sources)):
+            if paths and arrays[0] is offsets:
+                paths.append(paths[0])
+                continue
+            with tempfile.NamedTemporaryFile(suffix='.graph', delete=False) as f:
+                paths.append(f.name)
+            save_snapshot(f.name, 'directed', *arrays)
+        with ProcessPoolExecutor(workers, initializer=_open_state, initargs=(*paths, memory.name)) as pool:
+            return _search((offsets, targets, r_offsets, r_sources, levels), start, pool, workers)
+    finally:
+        levels.release()
+        memory.close()
+        memory.unlink()
+        for path in set(paths):
+            os.remove(path)
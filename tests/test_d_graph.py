@@ -0,0 +1,530 @@
+import random
+import unittest
+from collections import deque
+from graphlib import CycleError
+from unittest import mock
+
+from d_graph import DirectedGraph, _CSRStorage, np
+
+EDGES = [(0, 1, 10), (4, 0, 12), (1, 4, 15), (4, 3, 3), (3, 1, 5), (2, 1, 23), (3, 2, 7)]
+STORAGES = ('dense', 'csr', 'numpy') if np is not None else ('dense', 'csr')
+
+
+@unittest.skipIf(np is None, 'needs NumPy')
+class NumpyValuesTest(unittest.TestCase):
+
+    def test_numpy_rows_in_constructor(self):
+        g = DirectedGraph(np.array([[0, 1, 10], [4, 0, 12], [1, 4, 15]]))
+        self.assertEqual(g.edge_count(), 3)
+        self.assertEqual(g.get_edges(), [(0, 1, 10), (1, 4, 15), (4, 0, 12)])
+
+    def test_numpy_scalar_weights(self):
+        for storage in STORAGES:
+            g = DirectedGraph.from_edge_list(EDGES, storage=storage)
+            g.add_edge(0, 2, np.float64(2.5))
+            g.add_edge(0, 1, np.int64(4))
+            g.add_edges_bulk([(1, 2, np.int64(3)), (1, 4, np.int64(0))])
+            self.assertEqual(g.edge_count(), 8)
+            g.remove_edge(0, 2)
+            self.assertEqual(g.edge_count(), 7)
+            self.assertEqual(g.edge_count(), len(g.get_edges()))
+
+    def test_one_float_weight_keeps_the_other_weights_int(self):
+        dense = DirectedGraph(EDGES)
+        dense.add_edge(0, 2, 2.5)
+        for storage in ('csr', 'numpy'):
+            g = DirectedGraph.from_edge_list(EDGES, storage=storage)
+            g.add_edge(1, 2, np.int64(6))
+            g.remove_edge(1, 2)
+            g.add_edge(0, 2, 2.5)
+            self.assertEqual(repr(g.get_edges()), repr(dense.get_edges()))
+            self.assertEqual(str(g), str(dense))
+            self.assertEqual(repr(g.dijkstra(0)), repr(dense.dijkstra(0)))
+            self.assertEqual(repr(g._storage.in_neighbors(1)), repr(dense._storage.in_neighbors(1)))
+            self.assertEqual(repr(g._storage.get(0, 1)), '10')
+            self.assertEqual(repr(g._storage.get(0, 2)), '2.5')
+
+    def test_frontier_bfs_matches_dense(self):
+        edges = random_edges(11, 200, 500)
+        dense = DirectedGraph.from_edge_list(edges, v_count=200)
+        numpy = DirectedGraph.from_edge_list(edges, storage='numpy', v_count=200)
+        for v_start, v_end in ((0, None), (7, None), (3, 150), (5, 5), (9, 0)):
+            self.assertEqual(numpy.bfs(v_start, v_end), dense.bfs(v_start, v_end))
+
+    def test_numpy_integer_weight_keeps_integer_storage(self):
+        g = DirectedGraph.from_edge_list(EDGES, storage='csr')
+        g.add_edge(1, 2, np.int64(6))
+        self.assertEqual(g._storage.typecode, 'q')
+        self.assertEqual(g.dijkstra(1), [27, 0, 6, 18, 15])
+
+
+def random_edges(seed, n, m):
+    rng = random.Random(seed)
+    return [(rng.randrange(n), rng.randrange(n), rng.randint(1, 20)) for _ in range(m)]
+
+
+class DenseStorageTest(unittest.TestCase):
+
+    def test_rows_hold_only_the_edges(self):
+        g = DirectedGraph(random_edges(10, 1000, 300))
+        rows = g._storage.rows
+        self.assertEqual(len(rows), g.v_count)
+        self.assertEqual(sum(map(len, rows)), g.edge_count())
+        g.remove_edge(*g.get_edges()[0][:2])
+        self.assertEqual(sum(map(len, rows)), g.edge_count())
+
+    def test_constructor_scales_with_the_edges(self):
+        # 50000 vertices would be a matrix of 2.5 billion cells, the rows only hold the 100000 edges.
+        n = 50000
+        rng = random.Random(12)
+        edges = [(v, rng.randrange(n), 1) for v in range(n) for _ in range(2)]
+        g = DirectedGraph(edges)
+        self.assertEqual(g.v_count, n)
+        self.assertEqual(sum(map(len, g._storage.rows)), g.edge_count())
+        self.assertEqual(g.get_edges()[:2], sorted(edge for edge in edges if edge[0] == 0 and edge[1] != 0))
+
+    def test_short_rows_read_as_zero(self):
+        g = DirectedGraph(EDGES)
+        g.add_vertices(3)
+        g.add_edge(7, 0, 4)
+        g.add_edge(0, 6, 2)
+        self.assertEqual(g.adj_matrix[2], (0, 23, 0, 0, 0, 0, 0, 0))
+        self.assertEqual(g.adj_matrix[5], (0,) * 8)
+        self.assertEqual(g._storage.in_neighbors(6), [(0, 2)])
+        self.assertEqual(g.dijkstra(7), [4, 14, 39, 32, 29, float('inf'), 6, 0])
+
+    def test_matrix_rows_are_read_only(self):
+        for storage in STORAGES:
+            g = DirectedGraph.from_edge_list(EDGES, storage=storage)
+            with self.assertRaises(TypeError):
+                g.adj_matrix[0][2] = 5
+            self.assertEqual(list(g.adj_matrix)[2], (0, 23, 0, 0, 0))
+            g.adj_matrix = [[0, 3], [0, 0]]
+            self.assertEqual((g.storage, g.get_edges()), ('dense', [(0, 1, 3)]))
+
+
+class DijkstraTest(unittest.TestCase):
+
+    def test_full_runs_match_early_exit(self):
+        edges = random_edges(9, 150, 600)
+        for storage in STORAGES:
+            g = DirectedGraph.from_edge_list(edges, storage=storage)
+            g.add_edge(3, 4, 2.5)
+            for src in (0, 3, 77):
+                distance = g.dijkstra(src)
+                self.assertEqual(distance, [g.shortest_path(src, dst)[0] for dst in range(150)])
+
+    def test_counts(self):
+        for storage in STORAGES:
+            g = DirectedGraph.from_edge_list(EDGES, storage=storage)
+            stats = g.enable_instrumentation()
+            g.dijkstra(0)
+            self.assertEqual((stats.vertices_visited, stats.edges_relaxed), (5, 7))
+            self.assertEqual(stats.heap_pushes, stats.heap_pops)
+
+
+class DijkstraCacheTest(unittest.TestCase):
+
+    def cached_graph(self, maxsize=128):
+        g = DirectedGraph(EDGES)
+        g.enable_dijkstra_cache(maxsize)
+        return g
+
+    def test_hits_and_misses(self):
+        g = self.cached_graph()
+        self.assertEqual(g.dijkstra(0), [0, 10, 35, 28, 25])
+        g.dijkstra(0)[1] = 99
+        self.assertEqual(g.dijkstra(0), [0, 10, 35, 28, 25])
+        self.assertEqual(g.dijkstra_cache_info(), (2, 1, 128, 1))
+        g.disable_dijkstra_cache()
+        self.assertIsNone(g.dijkstra_cache_info())
+
+    def test_least_recently_used_is_dropped(self):
+        g = self.cached_graph(maxsize=2)
+        for src in (0, 1, 0, 2):
+            g.dijkstra(src)
+        self.assertEqual(list(g._cache.entries), [0, 2])
+        self.assertEqual(g.dijkstra_cache_info(), (1, 3, 2, 2))
+
+    def test_edge_changes_drop_only_affected_sources(self):
+        g = self.cached_graph()
+        for src in range(5):
+            g.dijkstra(src)
+        # 0 -> 2 now beats 0 -> 1 -> 4 -> 3 -> 2, only the sources reaching 0 can use it.
+        g.add_edge(0, 2, 1)
+        self.assertEqual(sorted(g._cache.entries), [1, 2, 3, 4])
+        for src in range(5):
+            g.dijkstra(src)
+        # 2 -> 1 got longer, it is only on the shortest paths from 2.
+        g.add_edge(2, 1, 30)
+        self.assertEqual(sorted(g._cache.entries), [0, 1, 3, 4])
+        # Every shortest path into 4 used 1 -> 4, except from 4 itself.
+        g.remove_edge(1, 4)
+        self.assertEqual(sorted(g._cache.entries), [4])
+        self.assertEqual(g.dijkstra(0), [0, 10, 1, float('inf'), float('inf')])
+
+    def test_new_vertices_are_unreachable(self):
+        g = self.cached_graph()
+        g.dijkstra(0)
+        g.add_vertices(2)
+        self.assertEqual(g.dijkstra(0), [0, 10, 35, 28, 25, float('inf'), float('inf')])
+        self.assertEqual(g.dijkstra_cache_info().hits, 1)
+        g.add_vertex()
+        self.assertEqual(len(g.dijkstra(0)), 8)
+
+    def test_bulk_insert_clears(self):
+        g = self.cached_graph()
+        g.dijkstra(0)
+        g.add_edges_bulk([(0, 3, 1)])
+        self.assertEqual(g.dijkstra_cache_info().currsize, 0)
+        self.assertEqual(g.dijkstra(0), [0, 6, 8, 1, 21])
+
+    def test_random_changes_never_leave_stale_entries(self):
+        rng = random.Random(13)
+        cached = DirectedGraph.from_edge_list(random_edges(14, 30, 60), v_count=30)
+        plain = DirectedGraph.from_edge_list(random_edges(14, 30, 60), v_count=30)
+        cached.enable_dijkstra_cache(8)
+        for _ in range(300):
+            src, dst = rng.randrange(cached.v_count), rng.randrange(cached.v_count)
+            action, weight = rng.random(), rng.randint(1, 20)
+            for g in (cached, plain):
+                if action < 0.5:
+                    g.add_edge(src, dst, weight)
+                elif action < 0.95:
+                    g.remove_edge(src, dst)
+                else:
+                    g.add_vertex()
+            for v in rng.sample(range(cached.v_count), 3):
+                self.assertEqual(cached.dijkstra(v), plain.dijkstra(v))
+        self.assertGreater(cached.dijkstra_cache_info().hits, 100)
+
+
+class PathBatchTest(unittest.TestCase):
+
+    def paths(self, v_count, seed):
+        rng = random.Random(seed)
+        # Empty and single vertex paths, vertices out of range on either side, then random walks.
+        paths = [[], [0], [3], [-1], [v_count], [0, v_count + 5], [-2, 0], [0, 0]]
+        for _ in range(200):
+            path = [rng.randrange(v_count)]
+            for _ in range(rng.randrange(6)):
+                path.append(rng.randrange(-1, v_count + 1) if rng.random() < 0.05 else rng.randrange(v_count))
+            paths.append(path)
+        return paths
+
+    def expected_weight(self, g, path):
+        if not g.is_valid_path(path):
+            return float('inf')
+        return sum(g._storage.get(src, dst) for src, dst in zip(path, path[1:]))
+
+    def test_batches_match_is_valid_path(self):
+        for storage in STORAGES:
+            g = DirectedGraph.from_edge_list(random_edges(15, 12, 60), storage=storage, v_count=12)
+            g.add_edge(0, 1, 2.5)
+            for removed in ((), (3, 7)):
+                for v in removed:
+                    g.remove_vertex(v)
+                paths = self.paths(g.v_count, len(removed))
+                valid = g.validate_paths(paths)
+                weights = g.path_weights(paths)
+                if storage == 'numpy':
+                    self.assertEqual((valid.dtype, weights.dtype), (np.bool_, np.float64))
+                    valid, weights = valid.tolist(), weights.tolist()
+                else:
+                    self.assertIsInstance(valid, bytearray)
+                    self.assertEqual(weights.typecode, 'd')
+                self.assertEqual([bool(ok) for ok in valid], [g.is_valid_path(path) for path in paths], storage)
+                self.assertEqual(list(weights), [self.expected_weight(g, path) for path in paths], storage)
+                self.assertGreater(sum(valid), 20)
+
+    def test_empty_batch(self):
+        for storage in STORAGES:
+            g = DirectedGraph.from_edge_list(EDGES, storage=storage)
+            self.assertEqual(len(g.validate_paths([])), 0)
+            self.assertEqual(len(g.path_weights(iter([]))), 0)
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def test_traversals_count_vertices_and_edges(self):
+        for storage in STORAGES:
+            g = DirectedGraph.from_edge_list(EDGES, storage=storage)
+            stats = g.enable_instrumentation()
+            # Vertex 0 reaches all five vertices, which have seven out edges between them.
+            for method in (g.dfs, g.bfs):
+                stats.reset()
+                method(0)
+                self.assertEqual((stats.vertices_visited, stats.edges_relaxed), (5, 7), (storage, method))
+            stats.reset()
+            g.bfs(0, 4)
+            self.assertEqual(stats.vertices_visited, 3)
+
+    def test_whole_graph_walks_are_counted(self):
+        g = DirectedGraph(EDGES)
+        stats = g.enable_instrumentation()
+        g.has_cycle()
+        self.assertGreater(stats.vertices_visited, 0)
+        self.assertGreater(stats.edges_relaxed, 0)
+        stats.reset()
+        g.strongly_connected_components()
+        self.assertEqual((stats.vertices_visited, stats.edges_relaxed), (5, 7))
+        for src, dst in ((3, 1), (4, 0), (3, 2)):
+            g.remove_edge(src, dst)
+        stats.reset()
+        g.topological_order()
+        self.assertEqual((stats.vertices_visited, stats.edges_relaxed), (5, 4))
+
+    def test_callback_gets_counts_of_one_call(self):
+        calls = []
+        g = DirectedGraph(EDGES)
+        g.enable_instrumentation(lambda name, seconds, counts: calls.append((name, counts['vertices_visited'])))
+        g.dfs(2)
+        g.bfs(2)
+        self.assertEqual(calls, [('dfs', 5), ('bfs', 5)])
+        g.disable_instrumentation()
+        g.dfs(2)
+        self.assertEqual(len(calls), 2)
+
+
+class CSRStorageTest(unittest.TestCase):
+
+    def test_writes_between_reads_match_dense(self):
+        rng = random.Random(1)
+        edges = random_edges(1, 200, 600)
+        csr = DirectedGraph.from_edge_list(edges, storage='csr')
+        dense = DirectedGraph.from_edge_list(edges)
+        for _ in range(3000):
+            u, v = rng.randrange(200), rng.randrange(200)
+            if rng.random() < 0.6:
+                weight = rng.randint(1, 20)
+                csr.add_edge(u, v, weight)
+                dense.add_edge(u, v, weight)
+            else:
+                csr.remove_edge(u, v)
+                dense.remove_edge(u, v)
+            self.assertEqual(csr._storage.neighbors(u), dense._storage.neighbors(u))
+            self.assertEqual(csr._storage.in_neighbors(v), dense._storage.in_neighbors(v))
+        self.assertEqual(csr.get_edges(), dense.get_edges())
+        self.assertEqual(csr.edge_count(), dense.edge_count())
+        self.assertEqual(csr.dijkstra(0), dense.dijkstra(0))
+
+    def test_reads_do_not_merge(self):
+        # One write followed by a query used to rebuild every row of the arrays.
+        rng = random.Random(2)
+        g = DirectedGraph.from_edge_list(random_edges(2, 2000, 6000), storage='csr')
+        with mock.patch.object(_CSRStorage, '_merge_pending', autospec=True,
+                               side_effect=_CSRStorage._merge_pending) as merge:
+            for _ in range(100):
+                g.add_edge(rng.randrange(2000), rng.randrange(2000), 5)
+                g.shortest_path(rng.randrange(2000), rng.randrange(2000))
+                g.remove_edge(rng.randrange(2000), rng.randrange(2000))
+            self.assertEqual(merge.call_count, 0)
+
+    def test_reverse_is_updated_not_rebuilt(self):
+        rng = random.Random(5)
+        g = DirectedGraph.from_edge_list(random_edges(5, 2000, 6000), storage='csr')
+        dense = DirectedGraph.from_edge_list(g.get_edges())
+        with mock.patch.object(_CSRStorage, '_build_reverse', autospec=True,
+                               side_effect=_CSRStorage._build_reverse) as build:
+            for _ in range(100):
+                u, v, weight = rng.randrange(2000), rng.randrange(2000), rng.randint(1, 20)
+                for graph in (g, dense):
+                    graph.add_edge(u, v, weight)
+                    graph.remove_edge(v, u)
+                self.assertEqual(g.shortest_path(u, v, method='bidirectional'),
+                                 dense.shortest_path(u, v, method='bidirectional'))
+                self.assertEqual(g._storage.in_neighbors(u), dense._storage.in_neighbors(u))
+            self.assertEqual(build.call_count, 1)
+
+    def test_many_writes_merge(self):
+        g = DirectedGraph.from_edge_list(random_edges(3, 5000, 8000), storage='csr')
+        g.add_edges_bulk(random_edges(4, 5000, 3000))
+        self.assertEqual(g._storage.dirty, 0)
+        self.assertEqual(g._storage.pending, {})
+        expected = DirectedGraph.from_edge_list(random_edges(3, 5000, 8000) + random_edges(4, 5000, 3000),
+                                                storage='csr')
+        self.assertEqual(g.get_edges(), expected.get_edges())
+
+
+class CycleDetectionTest(unittest.TestCase):
+
+    def test_insert_work_is_local_on_csr(self):
+        # A reordering insert may only look at the vertices placed between its two ends, and on CSR storage
+        # it must not merge the arrays or rebuild the reverse edges to do so.
+        rng = random.Random(6)
+        n = 20000
+        edges = [(min(u, v), max(u, v), 1) for u, v, _ in random_edges(6, n, 3 * n) if u != v]
+        g = DirectedGraph.from_edge_list(edges, storage='csr')
+        g.enable_cycle_detection()
+        g._storage.in_neighbors(0)
+
+        with mock.patch.object(_CSRStorage, '_merge_pending', autospec=True,
+                               side_effect=_CSRStorage._merge_pending) as merge, \
+                mock.patch.object(_CSRStorage, '_build_reverse', autospec=True,
+                                  side_effect=_CSRStorage._build_reverse) as build:
+            inserted = 0
+            while inserted < 20:
+                lower = rng.randrange(n - 60)
+                upper = lower + rng.randrange(2, 60)
+                src, dst = g._topo.order[upper], g._topo.order[lower]
+                if g._storage.get(dst, src) or g._storage.get(src, dst):
+                    continue
+                with mock.patch.object(_CSRStorage, 'neighbors', autospec=True,
+                                       side_effect=_CSRStorage.neighbors) as out_edges, \
+                        mock.patch.object(_CSRStorage, 'in_neighbors', autospec=True,
+                                          side_effect=_CSRStorage.in_neighbors) as in_edges:
+                    try:
+                        g.add_edge(src, dst, 1)
+                    except CycleError:
+                        continue
+                self.assertLessEqual(out_edges.call_count + in_edges.call_count, 2 * (upper - lower + 1))
+                inserted += 1
+            self.assertEqual(merge.call_count, 0)
+            self.assertEqual(build.call_count, 0)
+
+        position = g._topo.position
+        for src, dst, _ in g.iter_edges():
+            self.assertLess(position[src], position[dst])
+        self.assertFalse(g.has_cycle())
+        self.assertEqual(g.find_cycle(), [])
+
+
+def reachable(g):
+    # reach[src] is the set of vertices src can reach, itself included, by a plain BFS over get_edges().
+    out = {v: [] for v in g.get_vertices()}
+    for src, dst, _ in g.get_edges():
+        out[src].append(dst)
+    reach = {}
+    for src in out:
+        seen, queue = {src}, deque([src])
+        while queue:
+            for dst in out[queue.popleft()]:
+                if dst not in seen:
+                    seen.add(dst)
+                    queue.append(dst)
+        reach[src] = seen
+    return reach
+
+
+class ComponentOrderTest(unittest.TestCase):
+
+    def graphs(self, seed, dag=False):
+        edges = random_edges(seed, 40, 70)
+        if dag:
+            edges = [(min(src, dst), max(src, dst), weight) for src, dst, weight in edges]
+        for storage in STORAGES:
+            g = DirectedGraph.from_edge_list(edges, storage=storage, v_count=40)
+            g.remove_vertex(11)
+            yield g
+
+    def test_strongly_connected_components(self):
+        for g in self.graphs(18):
+            reach = reachable(g)
+            components = g.strongly_connected_components()
+            self.assertEqual(sorted(v for component in components for v in component), g.get_vertices())
+            number = {v: index for index, component in enumerate(components) for v in component}
+            for component in components:
+                self.assertEqual(component, sorted(component))
+            for u in reach:
+                for v in reach:
+                    self.assertEqual(number[u] == number[v], v in reach[u] and u in reach[v])
+            for src, dst, _ in g.get_edges():
+                self.assertLessEqual(number[src], number[dst])
+            self.assertGreater(len(components), 5)
+            self.assertLess(len(components), 39)
+
+    def test_condensation(self):
+        for g in self.graphs(19):
+            components, dag = g.condensation()
+            self.assertEqual(components, g.strongly_connected_components())
+            self.assertEqual(dag.storage, g.storage)
+            self.assertFalse(dag.has_cycle())
+            number = {v: index for index, component in enumerate(components) for v in component}
+            expected = {}
+            for src, dst, weight in g.get_edges():
+                key = (number[src], number[dst])
+                if key[0] != key[1]:
+                    expected[key] = min(weight, expected.get(key, weight))
+            self.assertEqual(dag.get_edges(), sorted((src, dst, weight) for (src, dst), weight in expected.items()))
+
+    def test_topological_levels(self):
+        for g in self.graphs(20, dag=True):
+            levels = g.topological_levels()
+            level_of = {v: index for index, level in enumerate(levels) for v in level}
+            self.assertEqual(sorted(level_of), g.get_vertices())
+            parents = {v: [] for v in level_of}
+            for src, dst, _ in g.get_edges():
+                self.assertLess(level_of[src], level_of[dst])
+                parents[dst].append(level_of[src])
+            for v, level in level_of.items():
+                self.assertEqual(max(parents[v], default=-1), level - 1)
+            self.assertEqual(g.topological_order(), [v for level in levels for v in level])
+
+    def test_cycles_raise(self):
+        for g in self.graphs(21, dag=True):
+            g.add_edge(39, 0, 1)
+            g.add_edge(0, 39, 1)
+            for method in (g.topological_levels, g.topological_order):
+                with self.assertRaises(CycleError) as raised:
+                    method()
+                cycle = raised.exception.args[1]
+                self.assertEqual(cycle[0], cycle[-1])
+                for src, dst in zip(cycle, cycle[1:]):
+                    self.assertNotEqual(g._storage.get(src, dst), 0)
+
+    def test_transitive_closure(self):
+        # NumPy storage squares the matrix, the others combine bitsets over the condensation.
+        for g in self.graphs(22):
+            reach = reachable(g)
+            closure = g.transitive_closure()
+            if g.storage == 'numpy':
+                self.assertEqual(closure.dtype, np.bool_)
+                closure = closure.tolist()
+            expected = [[src in reach and dst in reach[src] for dst in range(g.v_count)] for src in range(g.v_count)]
+            self.assertEqual(closure, expected)
+
+
+class RemoveVertexTest(unittest.TestCase):
+
+    def test_add_vertex_after_removal(self):
+        g = DirectedGraph(EDGES)
+        g.remove_vertex(1)
+        v = g.add_vertex() - 1
+        self.assertEqual(v, 5)
+        self.assertEqual(g.get_vertices(), [0, 2, 3, 4, 5])
+        self.assertEqual(g.add_vertices(2), 8)
+        self.assertEqual(g.reuse_vertex(), 1)
+        self.assertEqual(g.reuse_vertex(), 8)
+        self.assertEqual(g.get_vertices(), list(range(9)))
+        g.add_edge(1, 5, 4)
+        self.assertEqual(g.dijkstra(1)[5], 4)
+
+    def test_matches_dense(self):
+        rng = random.Random(7)
+        edges = random_edges(7, 300, 1200)
+        graphs = [DirectedGraph.from_edge_list(edges, storage=storage) for storage in STORAGES]
+        for v in rng.sample(range(300), 100):
+            for g in graphs:
+                g.remove_vertex(v)
+        for g in graphs:
+            self.assertEqual(g.get_edges(), graphs[0].get_edges())
+            self.assertEqual(g.edge_count(), len(g.get_edges()))
+            self.assertEqual(g.get_vertices(), graphs[0].get_vertices())
+
+    def test_csr_removal_is_local(self):
+        # Removing a vertex only reads its own in and out edges, the arrays are never rebuilt.
+        rng = random.Random(8)
+        g = DirectedGraph.from_edge_list(random_edges(8, 20000, 80000), storage='csr')
+        g.remove_vertex(0)
+        with mock.patch.object(_CSRStorage, '_merge_pending', autospec=True,
+                               side_effect=_CSRStorage._merge_pending) as merge, \
+                mock.patch.object(_CSRStorage, '_build_reverse', autospec=True,
+                                  side_effect=_CSRStorage._build_reverse) as build:
+            for v in rng.sample(range(1, 20000), 200):
+                g.remove_vertex(v)
+            self.assertEqual(merge.call_count + build.call_count, 0)
+        self.assertEqual(g.edge_count(), len(g.get_edges()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from d_graph import DirectedGraph, np
+from ud_graph import UndirectedGraph
+
+# Files written by the version 1 snapshot format, before removed vertices were stored.
+# directed_v1.graph holds the PDF example graph, undirected_v1.graph the edges AB, AC, BC and CD.
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+
+EDGES = [(0, 1, 10), (4, 0, 12), (1, 4, 15), (4, 3, 3), (3, 1, 5), (2, 1, 23), (3, 2, 7)]
+STORAGES = ('dense', 'csr', 'numpy') if np is not None else ('dense', 'csr')
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'graph.bin')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_directed_round_trip(self):
+        for storage in STORAGES:
+            for mmap in (True, False):
+                g = DirectedGraph.from_edge_list(EDGES, storage=storage)
+                g.add_edge(0, 2, 2.5)
+                g.save(self.path)
+                loaded = DirectedGraph.load(self.path, mmap=mmap)
+                self.assertEqual(loaded.get_edges(), g.get_edges())
+                self.assertEqual(loaded.edge_count(), g.edge_count())
+                self.assertEqual([loaded.dijkstra(v) for v in range(5)], [g.dijkstra(v) for v in range(5)])
+
+    def test_directed_mapped_copy_on_write(self):
+        DirectedGraph(EDGES).save(self.path)
+        loaded = DirectedGraph.load(self.path)
+        loaded.add_edge(0, 3, 1)
+        loaded.remove_edge(0, 1)
+        self.assertEqual(loaded.get_edges(), sorted(EDGES[1:] + [(0, 3, 1)]))
+        # The file itself is untouched.
+        self.assertEqual(DirectedGraph.load(self.path).get_edges(), sorted(EDGES))
+
+    def test_directed_removed_vertices(self):
+        g = DirectedGraph(EDGES)
+        g.remove_vertex(1)
+        g.save(self.path)
+        loaded = DirectedGraph.load(self.path)
+        self.assertEqual(loaded.get_vertices(), [0, 2, 3, 4])
+        self.assertEqual(loaded.get_edges(), g.get_edges())
+        self.assertEqual(loaded.compact(), g.compact())
+
+    def test_undirected_round_trip(self):
+        g = UndirectedGraph(['AB', 'AC', 'BC', 'BD', 'CD', 'CE', 'DE'])
+        g.add_vertex('lonely')
+        g.remove_vertex('B')
+        g.save(self.path)
+        for mmap in (True, False):
+            loaded = UndirectedGraph.load(self.path, mmap=mmap)
+            self.assertEqual(loaded.get_vertices(), g.get_vertices())
+            self.assertEqual(sorted(map(sorted, loaded.get_edges())), sorted(map(sorted, g.get_edges())))
+            self.assertEqual(loaded.edge_count(), g.edge_count())
+            self.assertEqual(loaded.bfs('A'), g.bfs('A'))
+
+    def test_wrong_kind(self):
+        DirectedGraph(EDGES).save(self.path)
+        with self.assertRaises(ValueError):
+            UndirectedGraph.load(self.path)
+
+    def test_version_1_directed(self):
+        g = DirectedGraph.load(os.path.join(DATA, 'directed_v1.graph'))
+        self.assertEqual(g.get_edges(), sorted(EDGES))
+        self.assertEqual(g.get_vertices(), [0, 1, 2, 3, 4])
+        self.assertEqual(g.dijkstra(0), [0, 10, 35, 28, 25])
+
+    def test_version_1_undirected(self):
+        g = UndirectedGraph.load(os.path.join(DATA, 'undirected_v1.graph'))
+        self.assertEqual(g.get_vertices(), ['A', 'B', 'C', 'D'])
+        self.assertEqual(g.get_edges(), [('A', 'B'), ('A', 'C'), ('B', 'C'), ('C', 'D')])
+
+    def test_version_1_resaved_as_version_2(self):
+        g = DirectedGraph.load(os.path.join(DATA, 'directed_v1.graph'))
+        g.save(self.path)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(6), b'GRPH\x02\x00')
+        self.assertEqual(DirectedGraph.load(self.path).get_edges(), sorted(EDGES))
+
+
+class EdgeFileTest(unittest.TestCase):
+
+    def test_directed_text_and_gzip(self):
+        lines = '# src dst weight\n0 1 10\n4,0,12\n\n1 4 15\n4 3 3\n3 1 5\n2 1 23\n3 2 7\n'
+        with tempfile.TemporaryDirectory() as folder:
+            for name, opener in (('edges.txt', open), ('edges.txt.gz', gzip.open)):
+                path = os.path.join(folder, name)
+                with opener(path, 'wt') as f:
+                    f.write(lines)
+                for storage in ('dense', 'csr'):
+                    g = DirectedGraph.from_edge_file(path, chunk_size=2, storage=storage)
+                    self.assertEqual(g.get_edges(), sorted(EDGES))
+
+    def test_undirected(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'edges.txt')
+            with open(path, 'w') as f:
+                f.write('A B\nA C\nB C\nA B\n')
+            g = UndirectedGraph.from_edge_file(path, chunk_size=1)
+            self.assertEqual(g.get_edges(), [('A', 'B'), ('A', 'C'), ('B', 'C')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import random
+import unittest
+from unittest import mock
+
+import d_graph
+import parallel_bfs
+from d_graph import DirectedGraph
+from ud_graph import UndirectedGraph
+
+
+def random_edges(seed, n, per_vertex):
+    rng = random.Random(seed)
+    return [(rng.randrange(n), rng.randrange(n), rng.randint(1, 20)) for _ in range(per_vertex * n)]
+
+
+class BfsLevelsParityTest(unittest.TestCase):
+    # PARALLEL_MIN is lowered so a small graph already sends its levels, top down and bottom up, to the pool.
+
+    def test_directed(self):
+        g = DirectedGraph.from_edge_list(random_edges(1, 600, 3), storage='csr')
+        serial = g.bfs_levels(0, workers=1)
+        with mock.patch.object(parallel_bfs, 'PARALLEL_MIN', 16):
+            parallel = g.bfs_levels(0, workers=2)
+        self.assertEqual(list(parallel.items()), list(serial.items()))
+        self.assertEqual(list(serial), sorted(g.bfs(0), key=lambda v: (serial[v], v)))
+
+    def test_directed_dense_storage(self):
+        g = DirectedGraph.from_edge_list(random_edges(2, 300, 2))
+        with mock.patch.object(parallel_bfs, 'PARALLEL_MIN', 16):
+            self.assertEqual(list(g.bfs_levels(5, workers=3).items()), list(g.bfs_levels(5, workers=1).items()))
+
+    def test_undirected(self):
+        g = UndirectedGraph.from_edge_list([(str(u), str(v)) for u, v, _ in random_edges(3, 500, 2)])
+        serial = g.bfs_levels('0', workers=1)
+        with mock.patch.object(parallel_bfs, 'PARALLEL_MIN', 16):
+            parallel = g.bfs_levels('0', workers=2)
+        self.assertEqual(list(parallel.items()), list(serial.items()))
+        self.assertEqual(set(serial), set(g.bfs('0')))
+
+
+class AllPairsParityTest(unittest.TestCase):
+    # PARALLEL_MIN is lowered so these small graphs still go to the pool.
+
+    def setUp(self):
+        patcher = mock.patch.object(d_graph, 'PARALLEL_MIN', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_workers_match_serial(self):
+        for storage in ('dense', 'csr'):
+            g = DirectedGraph.from_edge_list(random_edges(4, 120, 4), storage=storage)
+            serial = g.all_pairs_dijkstra(workers=1)
+            parallel = g.all_pairs_dijkstra(workers=3)
+            self.assertEqual(parallel.sources, serial.sources)
+            self.assertEqual(parallel.data, serial.data)
+            self.assertEqual(serial[7], g.dijkstra(7))
+
+    def test_sources_subset(self):
+        g = DirectedGraph.from_edge_list(random_edges(5, 80, 3))
+        sources = [3, 1, 40]
+        matrix = g.all_pairs_dijkstra(sources, workers=2)
+        for number, src in enumerate(sources):
+            self.assertEqual(matrix[number], g.dijkstra(src))
+            self.assertEqual(matrix.distance(src, 10), g.dijkstra(src)[10])
+
+    def test_floyd_warshall_matches_dijkstra(self):
+        g = DirectedGraph.from_edge_list(random_edges(6, 60, 3))
+        self.assertEqual(g.floyd_warshall().data, g.all_pairs_dijkstra(workers=1).data)
+
+    def test_small_graphs_stay_serial(self):
+        g = DirectedGraph.from_edge_list(random_edges(8, 60, 3))
+        with mock.patch.object(d_graph, 'PARALLEL_MIN', 200000), \
+                mock.patch.object(d_graph, 'ProcessPoolExecutor') as pool:
+            matrix = g.all_pairs_dijkstra(workers=4)
+        pool.assert_not_called()
+        self.assertEqual(list(matrix), [g.dijkstra(v) for v in range(60)])
+
+    def test_rows(self):
+        g = DirectedGraph.from_edge_list(random_edges(7, 20, 2))
+        for matrix in (g.all_pairs_dijkstra(workers=1), g.floyd_warshall()):
+            self.assertEqual(list(matrix), [g.dijkstra(v) for v in range(20)])
+            for index in (-1, 20):
+                with self.assertRaises(IndexError):
+                    matrix[index]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from unittest import mock
+
+from d_graph import DirectedGraph, DirectedSnapshot, np
+from ud_graph import UndirectedGraph
+
+EDGES = [(0, 1, 10), (4, 0, 12), (1, 4, 15), (4, 3, 3), (3, 1, 5), (2, 1, 23), (3, 2, 7)]
+STORAGES = ('dense', 'csr', 'numpy') if np is not None else ('dense', 'csr')
+
+
+class DirectedSnapshotTest(unittest.TestCase):
+
+    def test_snapshot_keeps_old_edges(self):
+        for storage in STORAGES:
+            g = DirectedGraph.from_edge_list(EDGES, storage=storage)
+            snapshot = g.snapshot()
+            g.remove_edge(0, 1)
+            g.add_edge(0, 2, 1)
+            self.assertEqual(snapshot.get_edges(), sorted(EDGES))
+            self.assertEqual(snapshot.dijkstra(0), [0, 10, 35, 28, 25])
+            self.assertNotEqual(g.get_edges(), snapshot.get_edges())
+
+    def test_snapshot_is_read_only(self):
+        snapshot = DirectedGraph(EDGES).snapshot()
+        with self.assertRaises(TypeError):
+            snapshot.add_edge(0, 2, 1)
+        with self.assertRaises(TypeError):
+            snapshot.remove_vertex(0)
+
+    def test_query_batch(self):
+        g = DirectedGraph(EDGES)
+        queries = [('dijkstra', v) for v in range(5)] + [('bfs', 0), ('shortest_path', 0, 2), ('iter_edges',)]
+        expected = [g.dijkstra(v) for v in range(5)] + [g.bfs(0), g.shortest_path(0, 2), list(g.iter_edges())]
+        self.assertEqual(g.query_batch(queries, workers=4), expected)
+        for query in (('_storage',), ('snapshot',), ('storage',)):
+            with self.assertRaises(ValueError):
+                g.query_batch([query])
+
+    def test_query_batch_leaves_storage_unshared(self):
+        # With no other snapshot around, the next change after a batch writes to the storage in place.
+        for storage in STORAGES:
+            g = DirectedGraph.from_edge_list(EDGES, storage=storage)
+            before = g._storage
+            g.query_batch([('dijkstra', 0)])
+            g.add_edge(0, 2, 1)
+            self.assertIs(g._storage, before)
+            snapshot = g.snapshot()
+            g.query_batch([('dijkstra', 0)])
+            g.remove_edge(0, 2)
+            self.assertIsNot(g._storage, before)
+            self.assertEqual(snapshot.get_edges(), sorted(EDGES + [(0, 2, 1)]))
+
+    def test_snapshot_taken_during_query_batch(self):
+        # A snapshot issued while a batch runs keeps the graph shared after the batch is done.
+        g = DirectedGraph(EDGES)
+        taken = []
+        bfs = DirectedSnapshot.bfs
+
+        def bfs_and_snapshot(snapshot, *args):
+            taken.append(g.snapshot())
+            return bfs(snapshot, *args)
+
+        with mock.patch.object(DirectedSnapshot, 'bfs', bfs_and_snapshot):
+            g.query_batch([('bfs', 0)])
+        g.add_edge(0, 3, 1)
+        self.assertEqual(taken[0].get_edges(), sorted(EDGES))
+
+    def test_nested_query_batch(self):
+        g = DirectedGraph(EDGES)
+        outer = g.snapshot()
+        g.query_batch([('bfs', 0)])
+        inner = g.snapshot()
+        g.query_batch([('bfs', 0)])
+        g.add_edge(0, 3, 1)
+        self.assertEqual(outer.get_edges(), sorted(EDGES))
+        self.assertEqual(inner.get_edges(), sorted(EDGES))
+
+
+class UndirectedSnapshotTest(unittest.TestCase):
+
+    def test_snapshot_keeps_old_edges(self):
+        g = UndirectedGraph(['AB', 'AC', 'BC', 'BD'])
+        snapshot = g.snapshot()
+        g.remove_vertex('B')
+        g.add_edge('C', 'E')
+        self.assertEqual(snapshot.get_edges(), [('A', 'B'), ('A', 'C'), ('B', 'C'), ('B', 'D')])
+        self.assertEqual(snapshot.bfs('D'), ['D', 'B', 'A', 'C'])
+        self.assertEqual(g.get_edges(), [('A', 'C'), ('C', 'E')])
+
+    def test_query_batch(self):
+        g = UndirectedGraph(['AB', 'AC', 'BC', 'BD', 'EF'])
+        queries = [('bfs', 'A'), ('dfs', 'D'), ('connected', 'A', 'F'), ('count_connected_components',)]
+        self.assertEqual(g.query_batch(queries, workers=2), [g.bfs('A'), g.dfs('D'), False, 2])
+        adj = g._adj
+        g.add_edge('E', 'A')
+        self.assertIs(g._adj, adj)
+
+
+if __name__ == '__main__':
+    unittest.main()
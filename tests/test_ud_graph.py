@@ -0,0 +1,180 @@
+import random
+import unittest
+from array import array
+from unittest import mock
+
+import ud_graph
+from ud_graph import UndirectedGraph
+
+EDGES = ['AE', 'AC', 'BE', 'CE', 'CD', 'CB', 'BD', 'ED', 'BH', 'QG', 'FG']
+
+
+class NeighbourSetTest(unittest.TestCase):
+    # HUB_DEGREE is lowered so a small graph already has hubs.
+
+    def test_hub_moves_to_a_dict(self):
+        with mock.patch.object(ud_graph, 'HUB_DEGREE', 4):
+            g = UndirectedGraph([('H', leaf) for leaf in 'ABCDE'])
+            hub = g._adj[g._ids['H']]
+            self.assertIs(type(hub), dict)
+            self.assertIs(type(g._adj[g._ids['A']]), array)
+            self.assertEqual(g.adj_list['H'], list('ABCDE'))
+            g.remove_edge('H', 'C')
+            g.remove_vertex('A')
+            self.assertEqual(g.adj_list['H'], list('BDE'))
+            self.assertEqual(g.bfs('H'), list('HBDE'))
+            self.assertEqual(g.edge_count(), 3)
+
+    def test_hubs_behave_like_small_sets(self):
+        rng = random.Random(23)
+        names = 'ABCDEFGHIJ'
+        graphs = [UndirectedGraph()]
+        with mock.patch.object(ud_graph, 'HUB_DEGREE', 2):
+            graphs.append(UndirectedGraph())
+            for _ in range(500):
+                u, v = rng.sample(names, 2)
+                action = rng.random()
+                for g in graphs:
+                    if action < 0.6:
+                        g.add_edge(u, v)
+                    elif action < 0.9:
+                        g.remove_edge(u, v)
+                    else:
+                        g.remove_vertex(u)
+                small, hubs = graphs
+                self.assertEqual(hubs.adj_list, small.adj_list)
+                self.assertEqual((hubs.dfs(u), hubs.bfs(v)), (small.dfs(u), small.bfs(v)))
+            self.assertTrue(any(type(neighbours) is dict for neighbours in hubs._adj))
+
+    def test_freed_ids_are_reused(self):
+        g = UndirectedGraph(['AB', 'BC', 'CA'])
+        index = g._ids['B']
+        g.remove_vertex('B')
+        g.add_edge('D', 'A')
+        self.assertEqual(g._ids['D'], index)
+        self.assertEqual(len(g._adj), 3)
+        self.assertEqual(g.adj_list, {'A': ['C', 'D'], 'C': ['A'], 'D': ['A']})
+
+    def test_sorted_views_are_dropped_on_change(self):
+        g = UndirectedGraph(['AD', 'AC'])
+        self.assertEqual(g.dfs('A'), ['A', 'C', 'D'])
+        self.assertIn(g._ids['A'], g._sorted_cache)
+        g.add_edge('A', 'B')
+        self.assertNotIn(g._ids['A'], g._sorted_cache)
+        self.assertEqual(g.dfs('A'), ['A', 'B', 'C', 'D'])
+        g.remove_edge('A', 'C')
+        self.assertEqual(g.dfs('A'), ['A', 'B', 'D'])
+        self.assertEqual(g.dfs('B'), ['B', 'A', 'D'])
+        g.remove_vertex('B')
+        self.assertEqual(g.dfs('A'), ['A', 'D'])
+        # E gets the freed id of B, the view cached for B must not come back with it.
+        g.add_edge('E', 'C')
+        self.assertEqual(g.dfs('E'), ['E', 'C'])
+
+
+class ConnectivityTest(unittest.TestCase):
+
+    def test_components(self):
+        g = UndirectedGraph(EDGES)
+        self.assertEqual(g.count_connected_components(), 2)
+        self.assertTrue(g.connected('A', 'H'))
+        self.assertFalse(g.connected('A', 'G'))
+        self.assertFalse(g.connected('A', 'Z'))
+        self.assertEqual({g.component_of(v) for v in 'ABCDEH'}, {g.component_of('A')})
+        self.assertEqual({g.component_of(v) for v in 'FGQ'}, {g.component_of('G')})
+        self.assertNotEqual(g.component_of('A'), g.component_of('G'))
+        self.assertIsNone(g.component_of('Z'))
+
+    def test_additions_update_the_index(self):
+        g = UndirectedGraph(EDGES)
+        components = g._union_find()
+        g.add_vertex('Z')
+        self.assertEqual(g.count_connected_components(), 3)
+        g.add_edge('H', 'G')
+        self.assertTrue(g.connected('A', 'F'))
+        g.add_edges_bulk([('Z', 'Y'), ('Y', 'A')])
+        self.assertTrue(g.connected('Z', 'Q'))
+        self.assertEqual(g.count_connected_components(), 1)
+        self.assertIs(g._union_find(), components)
+
+    def test_removals_rebuild_the_index(self):
+        g = UndirectedGraph(EDGES)
+        g.add_edge('H', 'G')
+        self.assertEqual(g.count_connected_components(), 1)
+        g.remove_edge('H', 'G')
+        self.assertIsNone(g._components)
+        self.assertEqual(g.count_connected_components(), 2)
+        # H only hangs off B.
+        g.remove_vertex('B')
+        self.assertFalse(g.connected('H', 'A'))
+        self.assertEqual(g.count_connected_components(), 3)
+        self.assertEqual(g.component_of('H'), 'H')
+
+    def test_random_changes_match_bfs(self):
+        rng = random.Random(17)
+        names = [str(number) for number in range(25)]
+        g = UndirectedGraph()
+        for _ in range(400):
+            u, v = rng.sample(names, 2)
+            action = rng.random()
+            if action < 0.1:
+                g.add_vertex(u)
+            elif action < 0.55:
+                g.add_edge(u, v)
+            elif action < 0.65:
+                g.add_edges_bulk([(u, v)])
+            elif action < 0.9:
+                g.remove_edge(u, v)
+            else:
+                g.remove_vertex(u)
+            reached = {v: set(g.bfs(v)) | {v} for v in g.get_vertices()}
+            self.assertEqual(g.count_connected_components(), len({frozenset(group) for group in reached.values()}))
+            for u, v in zip(names, rng.sample(names, len(names))):
+                self.assertEqual(g.connected(u, v), u in reached and v in reached[u])
+
+
+class PathBatchTest(unittest.TestCase):
+
+    def test_batches_match_is_valid_path(self):
+        g = UndirectedGraph(EDGES)
+        g.add_vertex('lonely')
+        g.remove_vertex('Q')
+        rng = random.Random(16)
+        names = list('ABCDEFGHQZ') + ['lonely']
+        paths = [[], ['A'], ['lonely'], ['Q'], ['Z'], ['A', 'A'], ['A', 'E', 'A']]
+        paths += [[rng.choice(names) for _ in range(rng.randrange(1, 6))] for _ in range(300)]
+        valid = g.validate_paths(paths)
+        weights = g.path_weights(paths)
+        self.assertIsInstance(valid, bytearray)
+        self.assertEqual(weights.typecode, 'd')
+        expected = [g.is_valid_path(path) for path in paths]
+        self.assertEqual([bool(ok) for ok in valid], expected)
+        self.assertEqual(list(weights), [len(path[1:]) if ok else float('inf') for path, ok in zip(paths, expected)])
+        self.assertGreater(sum(valid), 10)
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def test_traversals_count_vertices_and_edges(self):
+        g = UndirectedGraph(EDGES)
+        stats = g.enable_instrumentation()
+        # A reaches A, B, C, D, E and H, whose neighbour lists hold 2 * 9 entries between them.
+        for method in (g.dfs, g.bfs):
+            stats.reset()
+            method('A')
+            self.assertEqual((stats.vertices_visited, stats.edges_relaxed), (6, 18), method)
+
+    def test_whole_graph_walks_are_counted(self):
+        g = UndirectedGraph(EDGES)
+        stats = g.enable_instrumentation()
+        g.count_connected_components()
+        self.assertEqual((stats.vertices_visited, stats.edges_relaxed), (9, 22))
+        g.remove_edge('A', 'E')
+        stats.reset()
+        g.has_cycle()
+        self.assertGreater(stats.vertices_visited, 0)
+        self.assertGreater(stats.edges_relaxed, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
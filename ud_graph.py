@@ -4,7 +4,114 @@
 # Description: Replicate the data structure of an undirected graph.
 
 import heapq
+from array import array
 from collections import deque
+from collections.abc import Mapping
+from copy import copy
+
+from graph_io import load_snapshot, read_edge_chunks, save_snapshot, undirected_row
+from graph_snapshot import query_batch, share
+from graph_stats import GraphStats, disable_instrumentation, enable_instrumentation, uninstrument
+from parallel_bfs import bfs_levels
+
+# The neighbour ids of a vertex are kept in the order the edges were added. Small sets are an array('i')
+# and membership is a scan in C. Past HUB_DEGREE entries a set moves into a dict so membership,
+# insert and delete are O(1).
+HUB_DEGREE = 64
+
+
+def _link(neighbours, v):
+    # Add id v to a neighbour set and return the set, which becomes a dict once it grows past HUB_DEGREE.
+    # The caller makes sure v is not in the set yet.
+    if type(neighbours) is dict:
+        neighbours[v] = None
+        return neighbours
+    neighbours.append(v)
+    if len(neighbours) > HUB_DEGREE:
+        return dict.fromkeys(neighbours)
+    return neighbours
+
+
+def _unlink(neighbours, v):
+    # Remove id v from a neighbour set if it is there. A hub drops it in O(1), a small set finds it in a single
+    # scan of at most HUB_DEGREE ids, so unlinking never costs more than a constant.
+    if type(neighbours) is dict:
+        neighbours.pop(v, None)
+        return
+    try:
+        neighbours.remove(v)
+    except ValueError:
+        pass
+
+
+class _AdjacencyView(Mapping):
+    """
+    Read only view of the graph as a dict
+    - maps every vertex name to the list of its neighbour names
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, v):
+        names = self._graph._names
+        return [names[other] for other in self._graph._adj[self._graph._ids[v]]]
+
+    def __contains__(self, v):
+        return v in self._graph._ids
+
+    def __iter__(self):
+        return iter(self._graph._ids)
+
+    def __len__(self):
+        return len(self._graph._ids)
+
+
+class _UnionFind:
+    """
+    Disjoint sets of vertices, one set per connected component
+    - find() compresses the path it walks, union() hangs the lower ranked root under the other
+    - count is the number of sets
+    """
+
+    def __init__(self):
+        self.parent = {}
+        self.rank = {}
+        self.count = 0
+
+    def add(self, v):
+        if v not in self.parent:
+            self.parent[v] = v
+            self.rank[v] = 0
+            self.count += 1
+
+    def find(self, v):
+        # Walk up to the root, then point every vertex on the way straight at it.
+        root = v
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[v] != root:
+            self.parent[v], v = root, self.parent[v]
+        return root
+
+    def copy(self):
+        components = _UnionFind()
+        components.parent = dict(self.parent)
+        components.rank = dict(self.rank)
+        components.count = self.count
+        return components
+
+    def union(self, u, v):
+        first, second = self.find(u), self.find(v)
+        if first == second:
+            return
+        if self.rank[first] < self.rank[second]:
+            first, second = second, first
+        self.parent[second] = first
+        if self.rank[first] == self.rank[second]:
+            self.rank[first] += 1
+        self.count -= 1
+
 
 class UndirectedGraph:
     """
@@ -15,6 +122,17 @@ class UndirectedGraph:
     - vertex names are strings
     """
 
+    # Connectivity index, built on the first query and kept up to date while vertices and edges are added.
+    # Removing anything drops it so the next query rebuilds it.
+    _components = None
+    # Bumped by every snapshot(), see graph_snapshot.
+    _generation = 0
+    _stats = None
+
+    # Methods that are counted and timed while instrumentation is on.
+    _INSTRUMENTED = ('add_vertex', 'add_edge', 'add_edges_bulk', 'remove_edge', 'remove_vertex', 'validate_paths',
+                     'path_weights', 'dfs', 'bfs', 'connected', 'count_connected_components', 'has_cycle')
+
     def __init__(self, start_edges=None):
         """
         Store graph info as adjacency list
@@ -42,269 +160,471 @@ class UndirectedGraph:
 
     # ------------------------------------------------------------------ #
 
+    # Vertex names are interned to integer ids: _ids maps a name to its id, _names[id] is the name back,
+    # _adj[id] holds the neighbour ids and _free lists the ids of removed vertices for reuse.
+    # _ids keeps the order the vertices were added in.
+    # _sorted_cache[id] is the neighbour ids of id ordered by name, dropped whenever those neighbours change.
+
+    @property
+    def adj_list(self):
+        return _AdjacencyView(self)
+
+    @adj_list.setter
+    def adj_list(self, adjacency):
+        # Assigning a dict of vertex -> neighbours replaces the whole graph.
+        self._ids = {}
+        self._names = []
+        self._adj = []
+        self._free = []
+        self._sorted_cache = {}
+        self._edge_count = 0
+        self._components = None
+        self._shared = False
+        for v in adjacency:
+            self.add_vertex(v)
+        for v, neighbours in adjacency.items():
+            for u in neighbours:
+                self.add_edge(v, u)
+
+    def _intern(self, v):
+        # Return the id of v, adding it as a new vertex if it doesn't exist.
+        index = self._ids.get(v)
+        if index is not None:
+            return index
+        self._writable()
+        if self._free:
+            index = self._free.pop()
+            self._names[index] = v
+            self._adj[index] = array('i')
+        else:
+            index = len(self._names)
+            self._names.append(v)
+            self._adj.append(array('i'))
+        self._ids[v] = index
+        if self._components is not None:
+            self._components.add(index)
+        return index
+
+    def _writable(self):
+        # Called before anything changes. If a snapshot still shares the structures, take private copies first.
+        if self._shared:
+            self._ids = dict(self._ids)
+            self._names = list(self._names)
+            self._adj = [copy(neighbours) for neighbours in self._adj]
+            self._free = list(self._free)
+            self._sorted_cache = dict(self._sorted_cache)
+            if self._components is not None:
+                self._components = self._components.copy()
+            self._shared = False
+
+    def snapshot(self):
+        # Return a read only UndirectedSnapshot of the graph as it is now, in O(1).
+        # The next change copies the adjacency and the vertex tables, see graph_snapshot.
+        snapshot = UndirectedSnapshot.__new__(UndirectedSnapshot)
+        snapshot.__dict__.update(self.__dict__)
+        # Instrumentation belongs to this graph, the snapshot starts without it.
+        uninstrument(snapshot, self._INSTRUMENTED)
+        snapshot.__dict__.pop('_stats', None)
+        snapshot._token = share(self)
+        return snapshot
+
+    def query_batch(self, queries, workers: int = None) -> []:
+        # Answer each (method name, *args) query, such as ('bfs', 'A') or ('connected', 'A', 'B'), against one
+        # snapshot() from a thread pool. The results come back in the order of queries, see graph_snapshot.
+        return query_batch(self, queries, workers)
+
+    def _sorted(self, index):
+        # Neighbour ids of index, ordered by their names. Sorted once and reused until an edge of index changes.
+        view = self._sorted_cache.get(index)
+        if view is None:
+            view = array('i', sorted(self._adj[index], key=self._names.__getitem__))
+            self._sorted_cache[index] = view
+        return view
+
     def add_vertex(self, v: str) -> None:
-        # Adds a dictionary entry with an empty list.
-        self.adj_list[v] = []
-        
+        # Adds the vertex with an empty set of neighbours, unless it already exists.
+        self._intern(v)
+
     def add_edge(self, u: str, v: str) -> None:
         # If we are connecting the same node, don't do anything.
         if u == v:
             return
 
-        # find the edge list for each value, if they do not exist create a vertex.
-        first = self.adj_list.get(u)
-        second = self.adj_list.get(v)
-        if not first:
-            self.add_vertex(u)
-            first = self.adj_list.get(u)
-        if not second:
-            self.add_vertex(v)
-            second = self.adj_list.get(v)
-        
+        # find the id of each value, if they do not exist create a vertex.
+        first = self._intern(u)
+        second = self._intern(v)
+
         # Don't do anything if the nodes are already connected.
-        for adj_1 in first:
-            if adj_1 == v:
-                return
-            for adj_2 in second:
-                if adj_2 == u:
-                    return
-                if adj_1 == adj_2 and adj_2 != adj_2:
-                    return
-        
-        # If we pass then test, connect the two vertices together.
-        first.append(v)
-        second.append(u)
+        if second in self._adj[first]:
+            return
 
+        # If we pass then test, connect the two vertices together.
+        self._writable()
+        self._adj[first] = _link(self._adj[first], second)
+        self._adj[second] = _link(self._adj[second], first)
+        self._sorted_cache.pop(first, None)
+        self._sorted_cache.pop(second, None)
+        self._edge_count += 1
+        if self._components is not None:
+            self._components.union(first, second)
+
+    def add_edges_bulk(self, edges) -> None:
+        # Add many edges in a single pass, NumPy arrays of shape (n, 2) are accepted too.
+        # Loops are skipped and an edge that already exists is left as it is.
+        if hasattr(edges, 'tolist'):
+            edges = edges.tolist()
+        self._writable()
+        ids = self._ids
+        adj = self._adj
+        sorted_cache = self._sorted_cache
+        components = self._components
+        for u, v in edges:
+            if u == v:
+                continue
+            first = ids.get(u)
+            if first is None:
+                first = self._intern(u)
+            second = ids.get(v)
+            if second is None:
+                second = self._intern(v)
+            if second in adj[first]:
+                continue
+            adj[first] = _link(adj[first], second)
+            adj[second] = _link(adj[second], first)
+            sorted_cache.pop(first, None)
+            sorted_cache.pop(second, None)
+            self._edge_count += 1
+            if components is not None:
+                components.union(first, second)
+
+    @classmethod
+    def from_edge_list(cls, edges):
+        # Build a new graph with add_edges_bulk() instead of one add_edge() per edge.
+        graph = cls()
+        graph.add_edges_bulk(edges)
+        return graph
+
+    @classmethod
+    def from_edge_file(cls, path, chunk_size: int = 100000):
+        # Build a graph from a text file of "u v" lines, see graph_io.read_edge_chunks().
+        # The file is parsed chunk_size lines at a time and every chunk goes through add_edges_bulk().
+        graph = cls()
+        for chunk in read_edge_chunks(path, chunk_size, undirected_row):
+            graph.add_edges_bulk(chunk)
+        return graph
+
+    def _csr(self):
+        # Return (names, offsets, targets), the neighbours of names[v] are targets[offsets[v]:offsets[v + 1]].
+        # Vertices are renumbered in vertex order so the ids of removed vertices leave no gaps.
+        position = {index: number for number, index in enumerate(self._ids.values())}
+        offsets = array('q', [0])
+        targets = array('q')
+        for index in self._ids.values():
+            targets.extend(position[other] for other in self._adj[index])
+            offsets.append(len(targets))
+        return list(self._ids), offsets, targets
+
+    def save(self, path) -> None:
+        # Write the graph to a binary snapshot file, see graph_io for the layout.
+        names, offsets, targets = self._csr()
+        for name in names:
+            if not isinstance(name, str):
+                raise ValueError(f'vertex name {name!r} is not a string and can not be saved')
+        save_snapshot(path, 'undirected', offsets, targets, names=names)
+
+    @classmethod
+    def load(cls, path, mmap: bool = True):
+        # Read a graph written by save(). The neighbour sets are copied out of the file because they are
+        # changed in place, mmap only spares reading the whole file into memory first.
+        snapshot = load_snapshot(path, 'undirected', mmap)
+        graph = cls()
+        graph._names = snapshot.names
+        graph._ids = {name: index for index, name in enumerate(snapshot.names)}
+        offsets, targets = snapshot.offsets, snapshot.targets
+        for index in range(snapshot.v_count):
+            neighbours = array('i', targets[offsets[index]:offsets[index + 1]])
+            graph._adj.append(neighbours if len(neighbours) <= HUB_DEGREE else dict.fromkeys(neighbours))
+        graph._edge_count = len(targets) // 2
+        return graph
 
     def remove_edge(self, v: str, u: str) -> None:
-        # Get the edges of the two points, if one of them doesn't exist then do nothing.
-        first = self.adj_list.get(u)
-        second = self.adj_list.get(v)
-        if not first:
-            return
-        if not second:
+        # Get the ids of the two points, if one of them doesn't exist then do nothing.
+        first = self._ids.get(u)
+        second = self._ids.get(v)
+        if first is None or second is None:
             return
 
-        # If there is a match, then remove it from the list.
-        for adj_1 in first:
-            if adj_1 == v:
-                first.remove(v)
-                second.remove(u)
-            for adj_2 in second:
-                if adj_2 == u:
-                    first.remove(v)
-                    second.remove(u)
-                if adj_1 == adj_2 and adj_2 != adj_2:
-                    first.remove(v)
-                    second.remove(u)
-        
+        # If there is a match, then remove it from both sets.
+        if second in self._adj[first]:
+            self._writable()
+            _unlink(self._adj[first], second)
+            _unlink(self._adj[second], first)
+            self._sorted_cache.pop(first, None)
+            self._sorted_cache.pop(second, None)
+            self._edge_count -= 1
+            self._components = None
 
     def remove_vertex(self, v: str) -> None:
-        # Get a list of edges from the vertex you want to remove.
-        # If it doesn't exist do nothing, else remove all edges from the vertex and then pop it from the dictionary.
-        removal = self.adj_list.get(v)
-        if removal is None:
+        # If the vertex doesn't exist do nothing, else remove all edges from the vertex and free its id.
+        # Each neighbour is unlinked in constant time, so this is O(deg(v)) and the freed id is reused.
+        if v not in self._ids:
             return
-        else:
-            for item in removal:
-                node = self.adj_list.get(item)
-                node.remove(v)
-            self.adj_list.pop(v)
-        
+        self._writable()
+        index = self._ids.pop(v)
+        for other in self._adj[index]:
+            _unlink(self._adj[other], index)
+            self._sorted_cache.pop(other, None)
+        self._sorted_cache.pop(index, None)
+        self._edge_count -= len(self._adj[index])
+        self._names[index] = None
+        self._adj[index] = None
+        self._free.append(index)
+        self._components = None
 
     def get_vertices(self) -> []:
-        # Returns a list of keys
-        new_list = list(self.adj_list.keys())
-        return new_list
+        # Returns a list of vertex names
+        return list(self._ids)
+
+    def iter_edges(self):
+        # Yield every edge once as (u, v) without building a list. Vertices are walked in the order they were
+        # added, and an edge comes out at whichever end was added first.
+        done = bytearray(len(self._names))
+        names = self._names
+        for index in self._ids.values():
+            done[index] = 1
+            for other in self._adj[index]:
+                if not done[other]:
+                    yield names[index], names[other]
 
     def get_edges(self) -> []:
-        # Using the list of keys, iterate through it to print out a tuple of its edges.
-        # If there are no vertices, then do nothing.
-        new_list = list(self.adj_list.keys())
-        if not new_list:
-            return []
-        index = 0
-        final_list = []
-
-        # Print all tuples needed
-        for key in new_list:
-            edges = self.adj_list.get(key)
-            for edge in edges:
-                print = True
-                for num in range(index + 1):
-                    if edge == new_list[num]:
-                        print = False 
-                if print:
-                    final_list.append((key, edge))
-            index += 1
-        
-        return final_list
-        
+        return list(self.iter_edges())
+
+    def edge_count(self) -> int:
+        # The number of edges is kept up to date by every change, so this is O(1).
+        return self._edge_count
 
     def is_valid_path(self, path: []) -> bool:
         # If there is no path list, then return True
-        # If there is a single vertex, return True if the vertex exists.
-        found = False
-        index = 1
+        # If there is a single vertex, return True if the vertex exists and has edges.
         if len(path) == 0:
             return True
-        if len(path) == 1:
-            single = self.adj_list.get(path[0])
-            if not single:
+        ids = [self._ids.get(key) for key in path]
+        if ids[0] is None or not self._adj[ids[0]]:
+            return False
+
+        # Every next vertex has to exist and be a neighbour of the one before it.
+        for index in range(1, len(ids)):
+            if ids[index] is None or ids[index] not in self._adj[ids[index - 1]]:
                 return False
+        return True
+
+    def _path_hops(self, path):
+        # Number of edges along path, or None if is_valid_path() would reject it.
+        # Each hop is a lookup in the neighbour set of the vertex before it, O(1) for hubs.
+        ids = self._ids
+        adj = self._adj
+        previous = None
+        for key in path:
+            index = ids.get(key)
+            if index is None:
+                return None
+            if previous is None:
+                if not adj[index]:
+                    return None
+            elif index not in adj[previous]:
+                return None
+            previous = index
+        return max(len(path) - 1, 0)
+
+    def validate_paths(self, paths) -> bytearray:
+        # Run is_valid_path() on many paths at once, returns a bytearray of 0 or 1 per path.
+        paths = list(paths)
+        valid = bytearray(len(paths))
+        for number, path in enumerate(paths):
+            valid[number] = self._path_hops(path) is not None
+        return valid
+
+    def path_weights(self, paths) -> array:
+        # Every edge weighs 1, so the weight of a path is its number of edges. Returns an array('d') with
+        # inf for every path that isn't valid and 0 for an empty one.
+        weights = array('d')
+        for path in paths:
+            hops = self._path_hops(path)
+            weights.append(float('inf') if hops is None else hops)
+        return weights
+
+    def _dfs_order(self, start, visit, ordered=True, counts=None):
+        # Iterative DFS over vertex ids with an explicit stack of neighbour iterators, so long chains don't hit
+        # the recursion limit. Yields each id reachable from start the first time it is reached and flags it
+        # in the visit bytearray. With ordered the neighbours are walked in name order, otherwise as stored.
+        # counts, if given, gets [vertices reached, neighbours listed] added to it.
+        neighbours = self._sorted if ordered else self._adj.__getitem__
+
+        visit[start] = 1
+        yield start
+        edges = neighbours(start)
+        if counts is not None:
+            counts[0] += 1
+            counts[1] += len(edges)
+        stack = [iter(edges)]
+
+        while stack:
+            for vertex in stack[-1]:
+                if not visit[vertex]:
+                    visit[vertex] = 1
+                    yield vertex
+                    edges = neighbours(vertex)
+                    if counts is not None:
+                        counts[0] += 1
+                        counts[1] += len(edges)
+                    stack.append(iter(edges))
+                    break
             else:
-                return True  
-        else:
-            # Iterate through the keys and edges
-            # return True if the next element in path exists and the number is not repeating.
-            for key in path:
-                if key == path[len(path) - 1] and index == len(path):
-                    return True
-                edges = self.adj_list.get(key)
-                if not edges:
-                    return False
-                else:
-                    for edge in edges:
-                        if path[index] == edge:
-                            found = True
-                        
-                    if not found:
-                        return False
-
-                    found = False
-                    index += 1
-
-    def dfs_helper(self, cur, end, already):
-        # Only work if the current vertex has not been visited.
-        if cur not in already:
-            # Append the current vertex to the visit list.
-            already.append(cur)
-
-            cur_list = self.adj_list.get(cur)
-            cur_list.sort()
-            # Get a list of adj vertices and sort them.
-
-            # Recursively call similarily to a stack.
-            for vertex in cur_list:
-                self.dfs_helper(vertex, end, already)
-        
-
+                stack.pop()
 
     def dfs(self, v_start, v_end=None) -> []:
-        # If the starting vertex doesn't exist return an empty list.
-        check = self.adj_list.get(v_start)
-        if not check:
+        # If the starting vertex doesn't exist or has no edges return an empty list.
+        start = self._ids.get(v_start)
+        if start is None or not self._adj[start]:
             return []
 
-        # Initialize a visit list and call the recursive helper for dfs.
+        # Append vertices in the order the DFS reaches them and stop once the end is reached.
         visit = []
-        self.dfs_helper(v_start, v_end, visit)
-        
-        # If there is an end, then pop all elements until the end is reached.
-        if v_end is not None:
-            if v_end not in visit:
-                return visit
-            else:
-                for num in range(len(visit) - 1, -1, -1):
-                    if visit[num] != v_end:
-                        visit.pop()
-                    else:
-                        return visit
-
-        # else, return the regular list.
-        else:
-            return visit
+        counts = [0, 0] if self._stats is not None else None
+        for vertex in self._dfs_order(start, bytearray(len(self._names)), counts=counts):
+            visit.append(self._names[vertex])
+            if visit[-1] == v_end:
+                break
+        if counts is not None:
+            self._stats.count(*counts)
+        return visit
 
     def bfs(self, v_start, v_end=None) -> []:
-        # Track the visited nodes, the queue in which the BFS will use and the final array.
-        visit = []
-        queue = []
-        final = []
+        # Return an empty list if the start vertex doesn't exist or has no edges.
+        start = self._ids.get(v_start)
+        if start is None or not self._adj[start]:
+            return []
 
-        # Addes values to the end of the queues.
-        queue.append(v_start)
-        visit.append(v_start)
+        # Track the visited ids in a bytearray, the queue in which the BFS will use and the final array.
+        visit = bytearray(len(self._names))
+        queue = deque([start])
+        final = []
+        visit[start] = 1
+        scanned = 0
 
         # While there is a value in the queue.
         while queue:
 
-            # Pop the value from the front of the queue and append it to the final list.
-            value = queue.pop(0)
-            final.append(value)
-
-            # Get a list of sorted edges, and return an empty list if it doesn't exists.
-            cur_list = self.adj_list.get(value)
-            if not cur_list:
-                return []
-            cur_list.sort()
-            
-            # Iterate through the edges and if the vertex is not visited, append it to the visit and queue.
-            for edges in cur_list:
-                if edges not in visit:
-                    visit.append(edges)
-                    queue.append(edges)
+            # Pop the value from the front of the queue and append its name to the final list.
+            value = queue.popleft()
+            final.append(self._names[value])
 
-         # If there is an end, then pop all elements until the end is reached.
-        if v_end is not None:
-            if v_end not in final:
-                return final
-            else:
-                for num in range(len(final) - 1, -1, -1):
-                    if final[num] != v_end:
-                        final.pop()
-                    else:
-                        return final
-        
-        # else, return the regular list.
-        else:
-            return final
+            # Stop as soon as the end is reached.
+            if final[-1] == v_end:
+                break
 
+            # Iterate through the sorted edges and if the vertex is not visited, add it to the visit and queue.
+            neighbours = self._sorted(value)
+            scanned += len(neighbours)
+            for edges in neighbours:
+                if not visit[edges]:
+                    visit[edges] = 1
+                    queue.append(edges)
+
+        if self._stats is not None:
+            self._stats.count(len(final), scanned)
+        return final
+
+    def bfs_levels(self, v_start, workers: int = None) -> dict:
+        # Level synchronous BFS from v_start, returns {vertex: level} for the same vertices bfs() reaches,
+        # ordered by level. Each level is expanded top down or bottom up, whichever is cheaper, and big
+        # levels are split across a process pool, see parallel_bfs.
+        start = self._ids.get(v_start)
+        if start is None or not self._adj[start]:
+            return {}
+        names, offsets, targets = self._csr()
+        levels = bfs_levels(offsets, targets, offsets, targets, names.index(v_start), workers)
+        return {names[v]: level for v, level in levels.items()}
+
+    def _union_find(self):
+        # Return the connectivity index over vertex ids, rebuilding it from every edge if a removal dropped it.
+        if self._components is None:
+            components = _UnionFind()
+            for index in self._ids.values():
+                components.add(index)
+                for other in self._adj[index]:
+                    if other in components.parent:
+                        components.union(index, other)
+            self._components = components
+            if self._stats is not None:
+                self._stats.count(len(self._ids), 2 * self._edge_count)
+        return self._components
+
+    def connected(self, u: str, v: str) -> bool:
+        # Return True if there is a path between u and v.
+        if u not in self._ids or v not in self._ids:
+            return False
+        components = self._union_find()
+        return components.find(self._ids[u]) == components.find(self._ids[v])
+
+    def component_of(self, v: str):
+        # Return a representative vertex of the component of v, the same for every vertex in it.
+        # Returns None if v doesn't exist.
+        if v not in self._ids:
+            return None
+        return self._names[self._union_find().find(self._ids[v])]
 
     def count_connected_components(self):
-        # Perform a DFS on all vertices that are unvisited and count how many times a new recursive call from the main function.
-        count = 0
-        visit = []
-        vertices = list(self.adj_list.keys())
-
-        for vertex in vertices:
-            if vertex not in visit:
-                self.dfs_helper(vertex, None, visit)
-                count += 1
-
-        return count
-      
-
-    def has_cycle_helper(self, curr, last, already):
-        # Append the current vertex to visited.
-        already.append(curr)
-        curr_list = self.adj_list.get(curr)
-
-        # iterate through all edges in the current vertex, if it is not in the visit list then call the recursive function.
-        # Keep track of the previous vertex, if the vertex is in visit and it isn't looped to itself, then return True
-        for edges in curr_list:
-            if edges not in already:
-                if self.has_cycle_helper(edges, curr, already):
-                    return True
-            
-            elif last != edges:
-                return True
-        return False
+        # The connectivity index keeps one set per component.
+        return self._union_find().count
+
+    def enable_instrumentation(self, callback=None) -> GraphStats:
+        # Count and time the methods in _INSTRUMENTED, see graph_stats.
+        return enable_instrumentation(self, callback)
+
+    def disable_instrumentation(self) -> None:
+        disable_instrumentation(self)
+
+    def stats(self) -> GraphStats:
+        # The GraphStats of the instrumentation, or None while it is off.
+        return self._stats
 
     def has_cycle(self):
-        # Similar to the DFS, initialize a list of visited and get a list of vertices.
-        visit = []
-        vertices = list(self.adj_list.keys())
+        # A connected component without a cycle is a tree, so it has exactly one edge less than vertices.
+        # Walk every component once and compare its edge count against its vertex count.
+        visit = bytearray(len(self._names))
+        counts = [0, 0] if self._stats is not None else None
+
+        try:
+            for index in self._ids.values():
+                if not visit[index]:
+                    vertices = 0
+                    degrees = 0
+                    for member in self._dfs_order(index, visit, ordered=False, counts=counts):
+                        vertices += 1
+                        degrees += len(self._adj[member])
+                    if degrees // 2 >= vertices:
+                        return True
+            return False
+        finally:
+            if counts is not None:
+                self._stats.count(*counts)
+
+
+class UndirectedSnapshot(UndirectedGraph):
+    """
+    Read only copy of an UndirectedGraph, returned by UndirectedGraph.snapshot()
+    - shares its structures with the graph until the graph changes
+    - every change raises TypeError
+    """
 
-        # Call a recursive function on all vertices unvisited.
-        for vertex in vertices:
-            if vertex not in visit:
-                if self.has_cycle_helper(vertex, None, visit):
-                    return True
-        return False
+    adj_list = property(UndirectedGraph.adj_list.fget)
 
-       
+    def _writable(self):
+        raise TypeError('a graph snapshot is read only')
 
-   
+    def snapshot(self):
+        return self
 
 
 if __name__ == '__main__':